@@ -0,0 +1,97 @@
+import time
+from enum import Enum
+
+
+class BreakerState(Enum):
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+
+class CircuitOpen(Exception):
+    pass
+
+
+class CircuitBreaker:
+    '''
+    Opens after `threshold` consecutive failures, refusing calls for
+    `cooldown` seconds. After that it's half open, letting a single call
+    through to probe for recovery (refusing the rest until it's done): its
+    success closes it, its failure opens it again.
+    '''
+
+    def __init__(self, threshold: int = 3, cooldown: float = 60) -> None:
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.reset()
+
+    def reset(self) -> None:
+        self.failures = 0
+        self.opened_at: float | None = None
+        # whether a call is probing a half open breaker
+        self.probing = False
+        self.trips = 0
+        self.skipped = 0
+
+    @property
+    def state(self) -> BreakerState:
+        if self.opened_at is None:
+            return BreakerState.CLOSED
+        if time.monotonic() - self.opened_at < self.cooldown:
+            return BreakerState.OPEN
+        return BreakerState.HALF_OPEN
+
+    @property
+    def refusing(self) -> bool:
+        '''Whether check would raise CircuitOpen right now'''
+        state = self.state
+        return state is BreakerState.OPEN or (
+            state is BreakerState.HALF_OPEN and self.probing
+        )
+
+    def check(self) -> bool:
+        '''
+        Raises CircuitOpen if calls should be skipped, otherwise returns whether
+        this call is the probe, which must be released once it's done
+        '''
+        if self.refusing:
+            self.skipped += 1
+            raise CircuitOpen()
+        if self.state is BreakerState.HALF_OPEN:
+            self.probing = True
+            return True
+        return False
+
+    def release(self) -> None:
+        '''
+        Ends a probe, letting another call probe if it ended without a success
+        or failure, ie when it was abandoned
+        '''
+        self.probing = False
+
+    def success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def failure(self) -> None:
+        self.failures += 1
+        self.probing = False
+        if self.state is BreakerState.HALF_OPEN or (
+            self.state is BreakerState.CLOSED and self.failures >= self.threshold
+        ):
+            self.opened_at = time.monotonic()
+            self.trips += 1
+
+    def info(self) -> dict[str, object]:
+        return {
+            'state': self.state.value,
+            'failures': self.failures,
+            'trips': self.trips,
+            'skipped': self.skipped,
+            'retry_in': (
+                max(0.0, self.opened_at + self.cooldown - time.monotonic())
+                if self.opened_at is not None
+                else None
+            ),
+        }
@@ -1,11 +1,41 @@
+import zlib
+from collections.abc import AsyncGenerator
+from contextlib import asynccontextmanager
 from typing import Annotated
 
 from aiocache import Cache
+from aiocache.base import BaseCache
+from aiocache.serializers import BaseSerializer
 from fastapi import Depends
 
 from .settings import Settings, get_settings
+from .utils import set_shared_cache
 
 
 async def get_cache(settings: Annotated[Settings, Depends(get_settings)]) -> Cache:
     # TODO: use context manager here to autoclose once supported
     return Cache.from_url(settings.cache_url)
+
+
+class CompactSerializer(BaseSerializer):
+    DEFAULT_ENCODING = None
+
+    def dumps(self, value: bytes) -> bytes:
+        return zlib.compress(value)
+
+    def loads(self, value: bytes | None) -> bytes | None:
+        return None if value is None else zlib.decompress(value)
+
+
+@asynccontextmanager
+async def shared_cache(settings: Settings) -> AsyncGenerator[BaseCache]:
+    cache = Cache.from_url(settings.cache_url)
+    cache.serializer = CompactSerializer()
+    cache.namespace = 'cached:'
+
+    set_shared_cache(cache)
+    try:
+        yield cache
+    finally:
+        set_shared_cache(None)
+        await cache.close()
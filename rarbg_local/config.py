@@ -4,3 +4,13 @@ on_heroku = 'HEROKU' in os.environ
 production = os.environ.get('RAILWAY_ENVIRONMENT_NAME') == 'production' or on_heroku
 
 commit = os.environ.get('HEROKU_SLUG_COMMIT', os.environ.get('RAILWAY_GIT_COMMIT_SHA'))
+
+# requests per second, TMDB allows around 50
+tmdb_rate_limit = float(os.environ.get('TMDB_RATE_LIMIT', 40))
+
+# seconds between refreshes of the TMDB metadata for everything in the library
+cache_warm_interval = float(os.environ.get('CACHE_WARM_INTERVAL', 30 * 60))
+
+# seconds a provider search may take before its results are returned without
+# the providers that haven't finished
+search_deadline = float(os.environ.get('SEARCH_DEADLINE', 30))
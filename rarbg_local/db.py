@@ -221,6 +221,16 @@ class Monitor(Base):
     )
 
 
+class TmdbResponse(Base):
+    __tablename__ = 'tmdb_response'
+
+    key: Mapped[str] = mapped_column(primary_key=True)
+    etag: Mapped[str | None]
+    last_modified: Mapped[str | None]
+    fetched_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    body: Mapped[bytes]
+
+
 def create_download(
     *,
     transmission_id: str,
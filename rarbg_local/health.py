@@ -1,8 +1,10 @@
 import logging
 from collections.abc import Callable, Coroutine
+from dataclasses import asdict
 from datetime import datetime
+from functools import partial
 from os import getpid
-from typing import Any, cast, overload
+from typing import TYPE_CHECKING, Any, cast, overload
 
 from fastapi import APIRouter, Request
 from fastapi.concurrency import run_in_threadpool
@@ -22,6 +24,7 @@ from pydantic import BaseModel, RootModel
 from sqlalchemy.sql import text
 from statsig import StatsigServer
 
+from .breaker import BreakerState
 from .cache import get_cache
 from .config import commit
 from .db import get_async_sessionmaker
@@ -30,6 +33,10 @@ from .singleton import get as _get
 from .singleton import request_var
 from .statsig_service import get_statsig
 from .transmission_proxy import transmission
+from .utils import cache_info
+
+if TYPE_CHECKING:
+    from .providers.abc import Provider
 
 logger = logging.getLogger(__name__)
 router = APIRouter(tags=['diagnostics'])
@@ -66,9 +73,13 @@ def build() -> Healthcheck:
     )
     add_component(HealthcheckHTTPComponent('plex'), plex_connectivity)
     add_component(HealthcheckDatastoreComponent('cache'), check_cache)
+    add_component(HealthcheckInternalComponent('caches'), cache_stats)
 
     for provider in get_providers():
-        add_component(HealthcheckHTTPComponent(provider.type.value), provider.health)
+        add_component(
+            HealthcheckHTTPComponent(provider.type.value),
+            partial(check_provider, provider),
+        )
 
     add_component(HealthcheckInternalComponent('providers'), check_providers)
 
@@ -76,6 +87,8 @@ def build() -> Healthcheck:
         HealthcheckHTTPComponent('jikan'),
         lambda: check_http('https://api.jikan.moe/v4', 'GET'),
     )
+    add_component(HealthcheckInternalComponent('tmdb'), tmdb_ratelimit)
+    add_component(HealthcheckInternalComponent('warmer'), warmer_progress)
     add_component(HealthcheckInternalComponent('client_ip'), client_ip)
     add_component(HealthcheckInternalComponent('statsig'), statsig)
 
@@ -250,12 +263,65 @@ async def check_cache() -> HealthcheckCallbackResponse:
     )
 
 
+async def cache_stats() -> HealthcheckCallbackResponse:
+    return HealthcheckCallbackResponse(
+        HealthcheckStatus.PASS,
+        cache_info(),  # type: ignore[arg-type]
+    )
+
+
+async def tmdb_ratelimit() -> HealthcheckCallbackResponse:
+    from .tmdb import limiter
+
+    return HealthcheckCallbackResponse(
+        HealthcheckStatus.PASS,
+        limiter.info(),  # type: ignore[arg-type]
+    )
+
+
+async def warmer_progress() -> HealthcheckCallbackResponse:
+    from .warmer import progress
+
+    return HealthcheckCallbackResponse(
+        HealthcheckStatus.PASS,
+        asdict(progress),  # type: ignore[arg-type]
+    )
+
+
+async def check_provider(provider: 'Provider') -> HealthcheckCallbackResponse:
+    from .providers import breaker_for
+
+    # feeds the circuit breaker, so a failing provider is skipped by searches
+    # and a recovered one is tried again
+    breaker = breaker_for(provider)
+    try:
+        response = await provider.health()
+    except Exception:
+        breaker.failure()
+        raise
+
+    if response.status == HealthcheckStatus.PASS:
+        if breaker.state is not BreakerState.CLOSED:
+            breaker.success()
+    else:
+        breaker.failure()
+    return response
+
+
 async def check_providers() -> HealthcheckCallbackResponse:
-    from .providers import get_providers
+    from .providers import breaker_for, cancelled, get_providers
 
+    providers = get_providers()
     return HealthcheckCallbackResponse(
         HealthcheckStatus.PASS,
         {  # type: ignore[arg-type]
-            'providers': [provider.type.value for provider in get_providers()],
+            'providers': [provider.type.value for provider in providers],
+            'breakers': {
+                provider.type.value: breaker_for(provider).info()
+                for provider in providers
+            },
+            'cancelled': {
+                provider.type.value: cancelled[provider.type] for provider in providers
+            },
         },
     )
@@ -0,0 +1,77 @@
+import asyncio
+import logging
+from collections.abc import AsyncGenerator
+from contextlib import asynccontextmanager
+
+from aiohttp import ClientSession, TCPConnector
+from yarl import URL
+
+logger = logging.getLogger(__name__)
+
+LIMIT_PER_HOST = 10
+DNS_CACHE_TTL = 300
+KEEPALIVE_TIMEOUT = 30
+
+
+class ClientRegistry:
+    def __init__(self) -> None:
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.sessions: dict[URL, ClientSession] = {}
+        # sessions left behind by a previous loop, closed along with the rest
+        self.stale: list[ClientSession] = []
+
+    def get(self, url: str | URL) -> ClientSession:
+        origin = URL(url).origin()
+
+        loop = asyncio.get_running_loop()
+        if loop is not self.loop:
+            # sessions are bound to the loop they were created on
+            self.loop = loop
+            self.stale.extend(self.sessions.values())
+            self.sessions = {}
+
+        session = self.sessions.get(origin)
+        if session is None or session.closed:
+            logger.debug('Creating session for %s', origin)
+            session = self.sessions[origin] = ClientSession(
+                base_url=origin.with_path('/'),
+                connector=TCPConnector(
+                    limit=LIMIT_PER_HOST,
+                    limit_per_host=LIMIT_PER_HOST,
+                    ttl_dns_cache=DNS_CACHE_TTL,
+                    keepalive_timeout=KEEPALIVE_TIMEOUT,
+                ),
+            )
+        return session
+
+    async def close(self) -> None:
+        sessions = [*self.stale, *self.sessions.values()]
+        self.sessions, self.stale = {}, []
+        results = await asyncio.gather(
+            *(session.close() for session in sessions), return_exceptions=True
+        )
+        for session, result in zip(sessions, results):
+            if isinstance(result, Exception):
+                # ie the loop it was created on has since been closed
+                logger.warning('Unable to close %s', session, exc_info=result)
+
+
+registry = ClientRegistry()
+
+
+def get_session(url: str | URL) -> ClientSession:
+    '''
+    Returns the shared session for the host of the given url.
+
+    The session is owned by the registry, so callers must not close it
+    (ie, don't use it as a context manager)
+    '''
+    return registry.get(url)
+
+
+@asynccontextmanager
+async def http_clients() -> AsyncGenerator[ClientRegistry]:
+    try:
+        yield registry
+    finally:
+        await registry.close()
@@ -1,30 +1,67 @@
+from collections.abc import Iterable
+
+import orjson
 from aiohttp import ClientSession
 from cachetools import TTLCache
-from fuzzywuzzy import fuzz
+from rapidfuzz import fuzz, process
 
+from .http_client import get_session
 from .tmdb import get_tv
 from .utils import cached
 
+ROOT = 'https://api.jikan.moe/v4/'
+# how close (out of 100) two names need to be to be considered the same show
+CUTOFF = 95
+
 
 def make_jikan() -> ClientSession:
-    return ClientSession(base_url='https://api.jikan.moe/v4/')
+    return get_session(ROOT)
 
 
 @cached(TTLCache(256, 360))
 async def get_names(tmdb_id: int) -> set[str]:
     tv = await get_tv(tmdb_id)
-    async with make_jikan() as jikan:
-        res = await jikan.get('anime', params={'q': tv.name, 'limit': 1})
-        results = (await res.json())['data']
-        if not results:
-            return {tv.name}
+    async with make_jikan().get(
+        ROOT + 'anime', params={'q': tv.name, 'limit': 1}
+    ) as res:
+        results = (await res.json(loads=orjson.loads))['data']
+    if not results:
+        return {tv.name}
+
+    result = results[0]
+    if NameIndex([result['title']]).match([tv.name]) is None:
+        return {tv.name}
+
+    return set([tv.name, result['title']] + result['title_synonyms'])
+
+
+def normalise(name: str) -> str:
+    return name.lower()
 
-        result = results[0]
-        if closeness(tv.name, [result['title']]) < 95:
-            return {tv.name}
 
-        return set([tv.name, result['title']] + result['title_synonyms'])
+class NameIndex:
+    '''
+    A list of titles, normalised up front so that finding the one closest to
+    any of a show's names is a batched comparison per name, rather than a
+    Python level comparison per pair
+    '''
 
+    def __init__(self, titles: Iterable[str]) -> None:
+        self.titles = list(titles)
+        self.normalised = [normalise(title) for title in self.titles]
 
-def closeness(key: str, names: list[str]) -> int:
-    return max(fuzz.ratio(key.lower(), name.lower()) for name in names)
+    def match(self, names: Iterable[str], cutoff: float = CUTOFF) -> str | None:
+        '''The title closest to any of `names`, if any are at least `cutoff` close'''
+        best: tuple[float, int] | None = None
+        for name in names:
+            found = process.extractOne(
+                normalise(name),
+                self.normalised,
+                scorer=fuzz.ratio,
+                score_cutoff=cutoff,
+            )
+            if found and (best is None or found[1] > best[0]):
+                best = found[1], found[2]
+                # a better match isn't possible
+                cutoff = found[1]
+        return self.titles[best[1]] if best else None
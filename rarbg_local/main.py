@@ -4,7 +4,6 @@ import string
 from collections import defaultdict
 from collections.abc import Callable, Iterable
 from concurrent.futures._base import TimeoutError as FutureTimeoutError
-from typing import cast
 
 from fastapi.exceptions import HTTPException
 from requests.exceptions import ConnectionError
@@ -22,9 +21,10 @@ from .db import (
     get_episodes,
 )
 from .models import Episode, InnerTorrent, SeriesDetails
-from .tmdb import get_tv_episodes
+from .release import parse_release
+from .tmdb import get_tv_episodes, prefetch_tv
 from .transmission_proxy import get_torrent, torrent_add
-from .utils import non_null, precondition
+from .utils import lru_cache, non_null, precondition
 
 logging.basicConfig(level=logging.DEBUG)
 logging.getLogger("pika").setLevel(logging.WARNING)
@@ -40,52 +40,37 @@ def categorise(string: str) -> str:
         return string
 
 
-full_marker_re = re.compile(r'(S(\d{2})E(\d{2}))')
-partial_marker_re = re.compile(r'(S(\d{2}))')
-season_re = re.compile(r'\W(S\d{2})\W')
 punctuation_re = re.compile(f'[{string.punctuation} ]')
 
 
+@lru_cache(256)
+def episode_name_re(name: str) -> re.Pattern[str]:
+    '''Matches the episode's name as it would appear in a release name'''
+    return re.compile('.'.join(punctuation_re.sub(' ', name).split()), re.I)
+
+
 def normalise(episodes: list[Episode], title: str) -> str | None:
-    sel = full_marker_re.search(title)
-    if not sel:
-        sel = season_re.search(title)
-        if sel:
+    release = parse_release(title)
+    if release.marker is None:
+        if release.pack:
             return title
 
         logger.warning('unable to find marker in %s', title)
         return None
 
-    full, _, i_episode = sel.groups()
-
     episode = next(
-        (
-            episode
-            for episode in episodes
-            if episode.episode_number == int(i_episode, 10)
-        ),
+        (episode for episode in episodes if episode.episode_number == release.episode),
         None,
     )
     assert episode
 
-    to_replace = punctuation_re.sub(' ', episode.name)
-    to_replace = '.'.join(to_replace.split())
-    title = re.sub(to_replace, 'TITLE', title, flags=re.I)
+    title = episode_name_re(episode.name).sub('TITLE', title)
 
-    title = title.replace(full, 'S00E00')
+    title = title.replace(release.marker, 'S00E00')
 
     return title
 
 
-def extract_marker(title: str) -> tuple[str, str | None]:
-    m = full_marker_re.search(title)
-    if not m:
-        m = partial_marker_re.search(title)
-        precondition(m, f'Cannot find marker in: {title}')
-        return non_null(m).group(2), None
-    return cast(tuple[str, str], tuple(m.groups()[1:]))
-
-
 async def add_single(
     *,
     session: AsyncSession,
@@ -212,6 +197,12 @@ async def make_series_details(show: list[EpisodeDetails]) -> SeriesDetails:
     ep = show[0]
     d = ep.download
 
+    packs = tuple(
+        sorted({episode.season for episode in show if episode.is_season_pack()})
+    )
+    if len(packs) > 1:
+        await prefetch_tv(d.tmdb_id, packs)
+
     return SeriesDetails(
         title=ep.show_title,
         seasons=await resolve_show(show),
@@ -1,10 +1,18 @@
 from datetime import date, datetime
 from enum import Enum
-from typing import Annotated, Literal
+from typing import Annotated, Any, Literal
 
-from pydantic import AnyUrl, BaseModel, ConfigDict, StringConstraints, computed_field
+from pydantic import (
+    AnyUrl,
+    BaseModel,
+    ConfigDict,
+    PrivateAttr,
+    StringConstraints,
+    computed_field,
+)
 
 from .db import MonitorMediaType
+from .release import Release, parse_release
 from .types import ImdbId, TmdbId
 
 
@@ -37,6 +45,24 @@ class ITorrent(BaseModel):
     download: MagnetUri | AnyUrl
     category: str
     episode_info: EpisodeInfo | None = None
+    # other providers that returned the same torrent
+    also_from: list[ProviderSource] = []
+
+    _release: Release = PrivateAttr()
+
+    def model_post_init(self, context: Any) -> None:
+        self._release = parse_release(self.title)
+
+    @property
+    def release(self) -> Release:
+        return self._release
+
+
+class RankedUpdate(BaseModel):
+    """A torrent entering the top results, and the one it pushed out"""
+
+    inserted: ITorrent
+    evicted: ITorrent | None = None
 
 
 class UserSchema(Orm):
@@ -161,6 +187,17 @@ class SearchResponse(BaseModel):
     tmdb_id: TmdbId
 
 
+class TmdbBatchItem(BaseModel):
+    type: MediaType
+    tmdb_id: TmdbId
+
+
+class TmdbBatchResult(TmdbBatchItem):
+    title: str | None = None
+    imdb_id: ImdbId | None = None
+    error: str | None = None
+
+
 class DownloadResponse(Orm):
     id: int
 
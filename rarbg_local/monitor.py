@@ -1,10 +1,10 @@
 import logging
 from asyncio import gather
 from collections.abc import AsyncGenerator, Sequence
+from contextlib import aclosing
 from enum import Enum
 from typing import Annotated
 
-from aiohttp import ClientSession
 from aiontfy import Message, Ntfy
 from fastapi import APIRouter, Depends, HTTPException, Request
 from pydantic import BaseModel
@@ -26,10 +26,12 @@ from .db import (
     get_async_db,
     safe_delete,
 )
+from .http_client import get_session
 from .models import (
     MonitorGet,
     MonitorPost,
 )
+from .ratelimit import background
 from .tmdb import get_movie, get_tv
 from .types import TmdbId
 from .utils import non_null
@@ -39,9 +41,11 @@ logger = logging.getLogger(__name__)
 monitor_ns = APIRouter(tags=['monitor'])
 
 
+NTFY_ROOT = 'https://ntfy.sh'
+
+
 async def get_ntfy() -> AsyncGenerator[Ntfy, None]:
-    async with ClientSession() as session:
-        yield Ntfy("https://ntfy.sh", session)
+    yield Ntfy(NTFY_ROOT, get_session(NTFY_ROOT))
 
 
 @monitor_ns.get('')
@@ -145,8 +149,12 @@ async def monitor_cron(
 
     tasks = [check_monitor(request, monitor, session, ntfy) for monitor in monitors]
 
+    # don't compete with interactive requests for the TMDB rate limit
+    with background():
+        checked = await gather(*tasks, return_exceptions=True)
+
     results: list[CronResponse[MonitorGet]] = []
-    for result in await gather(*tasks, return_exceptions=True):
+    for result in checked:
         if isinstance(result, BaseException):
             logger.error('Error checking monitor', exc_info=result)
             results.append(
@@ -177,12 +185,12 @@ async def check_monitor(
 
     season = 1 if typ == MonitorMediaType.TV else None
 
-    has_results = None
-    async for result in _stream(
-        tmdb_id=monitor.tmdb_id, type=convert_type(typ), season=season
-    ):
-        has_results = result
-        break
+    # we only need to know there's something out there, so each provider
+    # stops at its first result, and the rest are cancelled once one arrives
+    async with aclosing(
+        _stream(tmdb_id=monitor.tmdb_id, type=convert_type(typ), season=season, limit=1)
+    ) as results:
+        has_results = await anext(results, None)
     if not has_results:
         message = f'No results for {monitor.title}'
         logger.info(message)
@@ -1,7 +1,9 @@
+import asyncio
 import logging
 import os
 import traceback
 from collections.abc import AsyncGenerator, Callable, Coroutine
+from contextlib import aclosing, asynccontextmanager
 from functools import wraps
 from typing import (
     Annotated,
@@ -11,7 +13,7 @@ from typing import (
     cast,
 )
 
-from fastapi import APIRouter, Depends, FastAPI, HTTPException
+from fastapi import APIRouter, Body, Depends, FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.openapi.utils import get_openapi
 from fastapi.requests import Request
@@ -26,6 +28,7 @@ from statsig import StatsigEvent, StatsigServer, StatsigUser
 from rarbg_local.openapi import simplify_operation_ids
 
 from .auth import security
+from .cache import shared_cache
 from .config import commit, production
 from .db import (
     Download,
@@ -33,13 +36,14 @@ from .db import (
     MovieDetails,
     User,
     get_async_db,
+    get_async_sessionmaker,
     get_movies,
     safe_delete,
 )
 from .health import router as health
+from .http_client import http_clients
 from .main import (
     add_single,
-    extract_marker,
     get_keyed_torrents,
     groupby,
     normalise,
@@ -58,23 +62,36 @@ from .models import (
     PlexMedia,
     PlexResponse,
     ProviderSource,
+    RankedUpdate,
     SearchResponse,
     StatsResponse,
+    TmdbBatchItem,
+    TmdbBatchResult,
     TvResponse,
     TvSeasonResponse,
 )
 from .monitor import monitor_ns
+from .parsing import parse_executor
 from .plex import get_imdb_in_plex, gracefully_get_plex
 from .providers import (
+    Deduplicator,
+    breakers,
+    cancelled,
     get_providers,
+    provider_registry,
+    results_key,
     search_for_tv,
+    search_movie,
+    search_tv,
 )
 from .providers.abc import (
     MovieProvider,
     TvProvider,
 )
+from .ranking import RankBy, top_k
+from .search_index import search_remote, title_index, top_up
 from .settings import Settings, get_settings
-from .singleton import singleton, store_request
+from .singleton import get, singleton, store_request
 from .statsig_service import get_statsig, get_statsig_user
 from .statsig_service import router as statsig_router
 from .tmdb import (
@@ -88,13 +105,22 @@ from .tmdb import (
     get_tv_episode_imdb_id,
     get_tv_episodes,
     get_tv_imdb_id,
-    search_themoviedb,
+    persistent_store,
+    prefetch_tv,
 )
 from .tmdb import (
     discover as tmdb_discover,
 )
 from .types import TmdbId
-from .utils import Message, non_null
+from .utils import (
+    Message,
+    cancel_on,
+    disconnected,
+    get_shared_cache,
+    is_cached,
+    non_null,
+)
+from .warmer import cache_warmer
 from .websocket import websocket_ns
 
 api = APIRouter()
@@ -119,12 +145,12 @@ async def delete(
 
 
 def eventstream[**P](
-    func: Callable[P, AsyncGenerator[BaseModel, None]],
+    func: Callable[P, AsyncGenerator[BaseModel, None]], request: Request
 ) -> Callable[P, Coroutine[Any, Any, StreamingResponse]]:
     @wraps(func)
     async def decorator(*args: P.args, **kwargs: P.kwargs) -> StreamingResponse:
         async def internal() -> AsyncGenerator[str, None]:
-            async for rset in func(*args, **kwargs):
+            async for rset in cancel_on(disconnected(request), func(*args, **kwargs)):
                 yield f'data: {rset.model_dump_json()}\n\n'
             yield 'data:\n\n'
 
@@ -142,16 +168,69 @@ StreamType = Literal['series', 'movie']
 @api.get(
     '/stream/{type}/{tmdb_id}',
     response_class=StreamingResponse,
-    responses={200: {"model": ITorrent, "content": {'text/event-stream': {}}}},
+    responses={
+        200: {
+            "model": Union[ITorrent, RankedUpdate],
+            "content": {'text/event-stream': {}},
+        }
+    },
 )
 async def stream(
+    request: Request,
     type: StreamType,
     tmdb_id: TmdbId,
     source: ProviderSource,
     season: int | None = None,
     episode: int | None = None,
+    fresh: bool = False,
+    top: Annotated[int | None, Query(gt=0)] = None,
+    rank_by: RankBy = 'seeders',
 ) -> StreamingResponse:
-    return await eventstream(stream_impl)(type, tmdb_id, source, season, episode)
+    breaker = breakers.get(source)
+    if (
+        breaker
+        and breaker.refusing
+        and not await has_cached_results(type, tmdb_id, source, season, episode, fresh)
+    ):
+        raise HTTPException(503, f'{source.value} is unavailable')
+
+    if top:
+        return await eventstream(top_k, request)(
+            stream_impl(type, tmdb_id, source, season, episode, fresh), top, rank_by
+        )
+    return await eventstream(stream_impl, request)(
+        type, tmdb_id, source, season, episode, fresh
+    )
+
+
+async def has_cached_results(
+    type: StreamType,
+    tmdb_id: TmdbId,
+    source: ProviderSource,
+    season: int | None = None,
+    episode: int | None = None,
+    fresh: bool = False,
+) -> bool:
+    '''Whether stream_impl would replay its results from the shared cache'''
+    cache = get_shared_cache()
+    provider = next(
+        (provider for provider in get_providers() if provider.type == source),
+        None,
+    )
+    if fresh or cache is None or provider is None:
+        return False
+
+    if type == 'series':
+        key = results_key(
+            provider, await get_tv_imdb_id(tmdb_id), non_null(season), episode
+        )
+    else:
+        key = results_key(provider, await get_movie_imdb_id(tmdb_id))
+    try:
+        return bool(await cache.exists(key))
+    except Exception:
+        logger.warning('Unable to read %s from shared cache', key, exc_info=True)
+        return False
 
 
 async def stream_impl(
@@ -160,6 +239,7 @@ async def stream_impl(
     source: ProviderSource,
     season: int | None = None,
     episode: int | None = None,
+    fresh: bool = False,
 ) -> AsyncGenerator[ITorrent, None]:
     provider = next(
         (provider for provider in get_providers() if provider.type == source),
@@ -172,36 +252,62 @@ async def stream_impl(
         if not isinstance(provider, TvProvider):
             return
 
-        async for item in provider.search_for_tv(
-            await get_tv_imdb_id(tmdb_id), tmdb_id, non_null(season), episode
-        ):
-            yield item
+        results = search_tv(
+            provider,
+            await get_tv_imdb_id(tmdb_id),
+            tmdb_id,
+            non_null(season),
+            episode,
+            fresh=fresh,
+        )
     else:
         if not isinstance(provider, MovieProvider):
             return
 
-        async for item in provider.search_for_movie(
-            await get_movie_imdb_id(tmdb_id), tmdb_id
-        ):
-            yield item
+        results = search_movie(
+            provider, await get_movie_imdb_id(tmdb_id), tmdb_id, fresh=fresh
+        )
+
+    try:
+        async with aclosing(results):
+            async for item in results:
+                yield item
+    except asyncio.CancelledError:
+        # cancelled while waiting on the provider
+        cancelled[source] += 1
+        raise
+    except GeneratorExit:
+        # or closed between results
+        cancelled[source] += 1
+        raise
 
 
 @api.get(
     '/select/{tmdb_id}/season/{season}/download_all',
     name='select',
 )
-async def api_select(tmdb_id: TmdbId, season: int) -> DownloadAllResponse:
-    tasks, results = await search_for_tv(await get_tv_imdb_id(tmdb_id), tmdb_id, season)
-
-    episodes = (await get_tv_episodes(tmdb_id, season)).episodes
+async def api_select(
+    tmdb_id: TmdbId,
+    season: int,
+    fresh: bool = False,
+    deadline: Annotated[float | None, Query(gt=0)] = None,
+) -> DownloadAllResponse:
+    season_details = asyncio.create_task(get_tv_episodes(tmdb_id, season))
+    results = search_for_tv(
+        await get_tv_imdb_id(tmdb_id), tmdb_id, season, fresh=fresh, deadline=deadline
+    )
 
+    # everything is collected before responding, so duplicates can be folded in
+    dedupe = Deduplicator(fold=True)
     packs_or_not: dict[bool, list[ITorrent]] = {True: [], False: []}
-    while not all(task.done() for task in tasks):
-        result = await results.get()
-        if isinstance(result, Message):
-            logger.info('Got message %s', result)
-        else:
-            packs_or_not[extract_marker(result.title)[1] is None].append(result)
+    async with aclosing(results):
+        async for result in results:
+            if isinstance(result, Message):
+                logger.info('Got message %s', result)
+            elif kept := dedupe.add(result):
+                packs_or_not[kept.release.pack].append(kept)
+
+    episodes = (await season_details).episodes
 
     packs = sorted(
         packs_or_not.get(True, []), key=lambda result: result.seeders, reverse=True
@@ -352,8 +458,29 @@ async def torrents() -> dict[str, InnerTorrent]:
 
 
 @api.get('/search')
-async def search(query: str) -> list[SearchResponse]:
-    return await search_themoviedb(query)
+async def search(
+    query: str, mode: Literal['remote', 'local', 'merged'] = 'remote'
+) -> list[SearchResponse]:
+    '''
+    remote: search TMDB
+    local: search titles we have seen before, topping them up from TMDB in the
+    background for subsequent searches
+    merged: local results first, followed by the rest of the TMDB results
+    '''
+    if mode == 'remote':
+        return await search_remote(query)
+
+    local = title_index.search(query)
+    if mode == 'local':
+        top_up(query)
+        return local
+
+    seen = {(result.type, result.tmdb_id) for result in local}
+    return local + [
+        result
+        for result in await search_remote(query)
+        if (result.type, result.tmdb_id) not in seen
+    ]
 
 
 @api.get('/providers', name='get_providers')
@@ -371,6 +498,54 @@ async def tmdb_configuration() -> Configuration:
     return await get_configuration()
 
 
+# the most items accepted by /tmdb/batch, and how many are resolved at once
+BATCH_LIMIT = 100
+BATCH_CONCURRENCY = 8
+
+
+async def prefetch_show(tmdb_id: TmdbId) -> None:
+    '''
+    Fetches a show and its external ids in one request, unless the show is
+    already cached. If that fails, `get_tv` and `get_tv_imdb_id` are left to
+    fetch them (or serve them stale) themselves
+    '''
+    if is_cached(get_tv, tmdb_id):
+        return
+    try:
+        await prefetch_tv(tmdb_id)
+    except Exception:
+        logger.warning('Unable to prefetch show %s', tmdb_id, exc_info=True)
+
+
+async def resolve_batch_item(item: TmdbBatchItem) -> TmdbBatchResult:
+    try:
+        if item.type == MediaType.MOVIE:
+            movie = await get_movie(item.tmdb_id)
+            title, imdb_id = movie.title, movie.imdb_id
+        else:
+            await prefetch_show(item.tmdb_id)
+            title = (await get_tv(item.tmdb_id)).name
+            imdb_id = await get_tv_imdb_id(item.tmdb_id)
+    except Exception as e:
+        logger.warning('Unable to resolve %s', item, exc_info=True)
+        return TmdbBatchResult(**item.model_dump(), error=str(e) or type(e).__name__)
+
+    return TmdbBatchResult(**item.model_dump(), title=title, imdb_id=imdb_id)
+
+
+@api.post('/tmdb/batch')
+async def tmdb_batch(
+    items: Annotated[list[TmdbBatchItem], Body(max_length=BATCH_LIMIT)],
+) -> list[TmdbBatchResult]:
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def resolve(item: TmdbBatchItem) -> TmdbBatchResult:
+        async with semaphore:
+            return await resolve_batch_item(item)
+
+    return await asyncio.gather(*map(resolve, items))
+
+
 @api.get('/plex/{thing_type}/{tmdb_id}')
 async def get_plex_imdb(
     thing_type: ThingType,
@@ -399,6 +574,9 @@ tv_ns = APIRouter(tags=['tv'])
 
 @tv_ns.get('/{tmdb_id}')
 async def api_tv(tmdb_id: TmdbId) -> TvResponse:
+    # the show page lists its seasons without their episodes, so those are
+    # left until a season is opened
+    await prefetch_show(tmdb_id)
     tv = await get_tv(tmdb_id)
     return TvResponse(
         **tv.model_dump(), imdb_id=await get_tv_imdb_id(tmdb_id), title=tv.name
@@ -501,6 +679,22 @@ def custom_openapi(app: FastAPI) -> dict:
     return app.openapi_schema
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncGenerator[None]:
+    settings = await get(app, get_settings)
+    sessionmaker = await get(app, get_async_sessionmaker)
+
+    with persistent_store(sessionmaker):
+        async with (
+            http_clients(),
+            shared_cache(settings),
+            parse_executor(settings),
+            provider_registry(settings),
+            cache_warmer(sessionmaker),
+        ):
+            yield
+
+
 def create_app() -> FastAPI:
     app = FastAPI(
         servers=[
@@ -520,6 +714,7 @@ def create_app() -> FastAPI:
         title='Media',
         version='0.1.0-' + (commit or 'dev'),
         debug=not production,
+        lifespan=lifespan,
     )
     #    app.middleware_stack.generate_plain_text = generate_plain_text
     app.include_router(
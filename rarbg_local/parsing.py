@@ -0,0 +1,75 @@
+import asyncio
+import logging
+from collections.abc import AsyncGenerator, Callable
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+from multiprocessing import get_context
+
+from .settings import Settings
+from .utils import non_null
+
+logger = logging.getLogger(__name__)
+
+_executor: Executor | None = None
+
+
+def make_executor(processes: int) -> Executor:
+    '''A pool of `processes` worker processes, or of threads when that's zero'''
+    if processes > 0:
+        # forking a process with threads running can deadlock
+        return ProcessPoolExecutor(processes, mp_context=get_context('forkserver'))
+    return ThreadPoolExecutor(thread_name_prefix='parse')
+
+
+@asynccontextmanager
+async def parse_executor(settings: Settings) -> AsyncGenerator[Executor]:
+    global _executor
+    _executor = make_executor(settings.parse_processes)
+    try:
+        yield _executor
+    finally:
+        # which may since have been swapped for threads
+        executor, _executor = non_null(_executor), None
+        await asyncio.to_thread(executor.shutdown, cancel_futures=True)
+
+
+async def run_parser[T, *Ts](func: Callable[[*Ts], T], *args: *Ts) -> T:
+    '''
+    Runs `func` (a module level function, taking and returning plain data)
+    off the event loop, so big pages don't hold up everything else.
+
+    Outside of the app's lifespan, ie in scripts and tests, this uses the
+    loop's default thread pool
+    '''
+    loop = asyncio.get_running_loop()
+    executor = _executor
+    try:
+        future = loop.run_in_executor(executor, func, *args)
+    except OSError as e:
+        # processes are only started once there's something to run, and may
+        # not be allowed here
+        if not isinstance(executor, ProcessPoolExecutor):
+            raise
+        return await loop.run_in_executor(use_threads(executor, e), func, *args)
+
+    try:
+        return await future
+    except BrokenProcessPool as e:
+        # a worker died, eg from running out of memory
+        if not isinstance(executor, ProcessPoolExecutor):
+            raise
+        return await loop.run_in_executor(use_threads(executor, e), func, *args)
+
+
+def use_threads(failed: Executor, e: BaseException) -> Executor | None:
+    '''
+    Replaces the `failed` process pool with threads, if another search hasn't
+    already, returning what to parse with now
+    '''
+    global _executor
+    if _executor is failed:
+        logger.error('Parsing process pool failed, parsing in threads', exc_info=e)
+        _executor = make_executor(0)
+        failed.shutdown(wait=False, cancel_futures=True)
+    return _executor
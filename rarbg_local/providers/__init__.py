@@ -1,87 +1,448 @@
 import logging
-from asyncio import Future, Queue
-from collections.abc import Callable, Coroutine, Iterable
+import re
+from asyncio import (
+    CancelledError,
+    Queue,
+    Timeout,
+    create_task,
+    current_task,
+    gather,
+    get_running_loop,
+    timeout,
+    timeout_at,
+)
+from base64 import b32decode
+from collections import Counter
+from collections.abc import (
+    AsyncGenerator,
+    Awaitable,
+    Callable,
+    Coroutine,
+    Iterable,
+    Mapping,
+)
+from contextlib import aclosing, asynccontextmanager, suppress
 from typing import Any
 
-from ..models import ITorrent
+from ..breaker import CircuitBreaker, CircuitOpen
+from ..config import search_deadline
+from ..models import ITorrent, ProviderSource
+from ..settings import DEFAULT_PROVIDERS, Settings
 from ..types import ImdbId, TmdbId
-from ..utils import Message, create_monitored_task
+from ..utils import (
+    Message,
+    get_shared_cache,
+    non_null,
+    type_adapter,
+)
 from .abc import MovieProvider, Provider, TvProvider
 
 type ProviderType[T] = Callable[..., Iterable[T]]
+type Put = Callable[[ITorrent | Message], Awaitable[None]]
 logger = logging.getLogger(__name__)
 
+# results held between the providers and the reader, past which the providers
+# wait for the reader to catch up
+MERGE_BUFFER = 64
 
-def get_providers() -> list[Provider]:
-    # from .horriblesubs import HorriblesubsProvider
-    # from .kickass import KickassProvider
-    # from .luna import LunaProvider
+# infohashes are either 40 hex or 32 base32 characters
+infohash_pattern = r'[0-9a-f]{40}|[2-7a-z]{32}'
+btih_re = re.compile(rf'urn:btih:({infohash_pattern})\b', re.I)
+bare_re = re.compile(infohash_pattern, re.I)
+hex_re = re.compile(r'\b[0-9a-f]{40}\b', re.I)
+
+
+breakers: dict[ProviderSource, CircuitBreaker] = {}
+# searches abandoned part way through, because the client went away
+cancelled = Counter[ProviderSource]()
+
+
+def breaker_for(provider: Provider) -> CircuitBreaker:
+    breaker = breakers.get(provider.type)
+    if breaker is None:
+        breaker = breakers[provider.type] = CircuitBreaker(
+            provider.failure_threshold, provider.cooldown
+        )
+    return breaker
+
+
+def provider_classes() -> dict[ProviderSource, type[Provider]]:
+    from .horriblesubs import HorriblesubsProvider
+    from .kickass import KickassProvider
+    from .luna import LunaProvider
     from .nyaasi import NyaaProvider
     from .piratebay import PirateBayProvider
-
-    # from .rarbg import RarbgProvider
+    from .rarbg import RarbgProvider
     from .torrents_csv import TorrentsCsvProvider
 
-    return [
-        # HorriblesubsProvider(),
-        # RarbgProvider(),
-        # KickassProvider(),
-        TorrentsCsvProvider(),
-        NyaaProvider(),
-        PirateBayProvider(),
-        # LunaProvider(),
-    ]
-
-
-async def search_for_tv(
-    imdb_id: ImdbId, tmdb_id: TmdbId, season: int, episode: int | None = None
-) -> tuple[list[Future[None]], Queue[ITorrent | Message]]:
-    async def worker(
-        output_queue: Queue[ITorrent | Message], provider: TvProvider
-    ) -> None:
+    return {
+        provider.type: provider
+        for provider in (
+            HorriblesubsProvider,
+            KickassProvider,
+            LunaProvider,
+            NyaaProvider,
+            PirateBayProvider,
+            RarbgProvider,
+            TorrentsCsvProvider,
+        )
+    }
+
+
+def build_providers(
+    enabled: Iterable[str], concurrency: Mapping[str, int] | None = None
+) -> list[Provider]:
+    classes = provider_classes()
+    providers = []
+    for name in enabled:
+        provider = classes[ProviderSource(name)]()
+        if concurrency and name in concurrency:
+            provider.concurrency = concurrency[name]
+        providers.append(provider)
+    return providers
+
+
+_providers: list[Provider] | None = None
+
+
+def get_providers() -> list[Provider]:
+    global _providers
+    if _providers is None:
+        # provider_registry isn't running, so use the defaults
+        _providers = build_providers(DEFAULT_PROVIDERS)
+    return _providers
+
+
+@asynccontextmanager
+async def provider_registry(settings: Settings) -> AsyncGenerator[list[Provider]]:
+    """
+    Builds the enabled providers once for the lifetime of the app, so they can
+    hold on to state (sessions, tokens, show lists) between searches
+    """
+    global _providers
+    providers = build_providers(settings.providers, settings.provider_concurrency)
+
+    async def run(hook: Callable[[], Awaitable[None]], provider: Provider) -> None:
         try:
-            async for result in provider.search_for_tv(
-                imdb_id, tmdb_id, season, episode
-            ):
-                output_queue.put_nowait(result)
+            await hook()
+        except Exception:
+            logger.exception('Unable to run %s for %s', hook.__name__, provider)
+
+    await gather(*(run(provider.startup, provider) for provider in providers))
+    _providers = providers
+    try:
+        yield providers
+    finally:
+        _providers = None
+        await gather(*(run(provider.shutdown, provider) for provider in providers))
+
+
+def infohash(download: str) -> str | None:
+    '''
+    The (lowercase hex) infohash from a magnet link, a bare infohash, or a
+    link to a .torrent file that mentions one
+    '''
+    if match := btih_re.search(download):
+        found = match.group(1)
+    elif bare_re.fullmatch(download):
+        found = download
+    elif match := hex_re.search(download):
+        found = match.group()
+    else:
+        return None
+
+    if len(found) == 32:
+        return b32decode(found.upper()).hex()
+    return found.lower()
+
+
+class Deduplicator:
+    '''
+    Drops torrents that another provider (or another page) already returned.
+
+    With `fold`, their source and seeders are folded into the copy that was
+    kept. That changes torrents after they've been returned, so is only for
+    results that are collected before being sent anywhere; when streaming,
+    duplicates are just dropped
+    '''
+
+    def __init__(self, fold: bool = False) -> None:
+        self.fold = fold
+        self.seen: dict[str, ITorrent] = {}
+
+    def add(self, torrent: ITorrent) -> ITorrent | None:
+        '''Returns the torrent to keep, or None if it's a duplicate'''
+        download = str(torrent.download)
+        key = infohash(download) or download
+
+        kept = self.seen.get(key)
+        if kept is None:
+            if self.fold:
+                # copied, so folding in duplicates doesn't change cached results
+                torrent = torrent.model_copy(
+                    update={'also_from': list(torrent.also_from)}
+                )
+            self.seen[key] = torrent
+            return torrent
+
+        if not self.fold:
+            return None
+        if torrent.source != kept.source and torrent.source not in kept.also_from:
+            kept.also_from.append(torrent.source)
+        kept.seeders = max(kept.seeders, torrent.seeders)
+        return None
+
+
+def results_key(
+    provider: Provider,
+    imdb_id: ImdbId,
+    season: int | None = None,
+    episode: int | None = None,
+) -> str:
+    return f'providers:{provider.type.value}:{imdb_id}:{season}:{episode}'
+
+
+async def cached_results(
+    provider: Provider,
+    key: str,
+    search: Callable[[], AsyncGenerator[ITorrent]],
+    fresh: bool = False,
+) -> AsyncGenerator[ITorrent]:
+    '''
+    Replays results for `key` from the shared cache when present, otherwise
+    streams them from `search` (unless the provider's circuit breaker is
+    open), caching them once the search completes
+    '''
+    cache = get_shared_cache()
+    adapter = type_adapter(list[ITorrent])
+
+    if cache is not None and not fresh:
+        try:
+            raw = await cache.get(key)
+        except Exception:
+            logger.warning('Unable to read %s from shared cache', key, exc_info=True)
+            raw = None
+        if raw is not None:
+            for result in adapter.validate_json(raw):
+                yield result
+            return
+
+    breaker = breaker_for(provider)
+    probe = breaker.check()
+
+    results = []
+    try:
+        async for result in search():
+            results.append(result)
+            yield result
+    except Exception:
+        breaker.failure()
+        raise
+    finally:
+        if probe:
+            breaker.release()
+    # only reached when the search ran to completion
+    breaker.success()
+
+    if cache is None:
+        return
+
+    ttl = provider.results_ttl if results else provider.empty_results_ttl
+    try:
+        await cache.set(key, adapter.dump_json(results), ttl=ttl)
+    except Exception:
+        logger.warning('Unable to write %s to shared cache', key, exc_info=True)
+
+
+def search_tv(
+    provider: TvProvider,
+    imdb_id: ImdbId,
+    tmdb_id: TmdbId,
+    season: int,
+    episode: int | None = None,
+    *,
+    fresh: bool = False,
+) -> AsyncGenerator[ITorrent]:
+    return cached_results(
+        provider,
+        results_key(provider, imdb_id, season, episode),
+        lambda: provider.search_for_tv(imdb_id, tmdb_id, season, episode),
+        fresh,
+    )
+
+
+def search_movie(
+    provider: MovieProvider, imdb_id: ImdbId, tmdb_id: TmdbId, *, fresh: bool = False
+) -> AsyncGenerator[ITorrent]:
+    return cached_results(
+        provider,
+        results_key(provider, imdb_id),
+        lambda: provider.search_for_movie(imdb_id, tmdb_id),
+        fresh,
+    )
+
+
+async def forward(
+    results: AsyncGenerator[ITorrent], put: Put, limit: int | None = None
+) -> None:
+    '''Passes on results, stopping the search once `limit` have been found'''
+    found = 0
+    async with aclosing(results):
+        async for result in results:
+            await put(result)
+            found += 1
+            if found == limit:
+                return
+
+
+def search_for_tv(
+    imdb_id: ImdbId,
+    tmdb_id: TmdbId,
+    season: int,
+    episode: int | None = None,
+    *,
+    fresh: bool = False,
+    deadline: float | None = None,
+    limit: int | None = None,
+) -> AsyncGenerator[ITorrent | Message]:
+    async def worker(put: Put, provider: TvProvider) -> None:
+        try:
+            await forward(
+                search_tv(provider, imdb_id, tmdb_id, season, episode, fresh=fresh),
+                put,
+                limit,
+            )
+        except CircuitOpen:
+            raise
         except Exception:
             logger.exception('Unable to load [TV] from %s', provider)
 
-    return await spin_up_workers(
+    return spin_up_workers(
         worker,
         [provider for provider in get_providers() if isinstance(provider, TvProvider)],
+        deadline,
+        probe=limit is not None,
     )
 
 
-async def search_for_movie(
-    imdb_id: ImdbId, tmdb_id: TmdbId
-) -> tuple[list[Future[None]], Queue[ITorrent | Message]]:
-    async def worker(
-        output_queue: Queue[ITorrent | Message], provider: MovieProvider
-    ) -> None:
+def search_for_movie(
+    imdb_id: ImdbId,
+    tmdb_id: TmdbId,
+    *,
+    fresh: bool = False,
+    deadline: float | None = None,
+    limit: int | None = None,
+) -> AsyncGenerator[ITorrent | Message]:
+    async def worker(put: Put, provider: MovieProvider) -> None:
         try:
-            async for result in provider.search_for_movie(imdb_id, tmdb_id):
-                output_queue.put_nowait(result)
+            await forward(
+                search_movie(provider, imdb_id, tmdb_id, fresh=fresh), put, limit
+            )
+        except CircuitOpen:
+            raise
         except Exception:
             logger.exception('Unable to load [MOVIE] from %s', provider)
 
-    return await spin_up_workers(
+    return spin_up_workers(
         worker,
         [
             provider
             for provider in get_providers()
             if isinstance(provider, MovieProvider)
         ],
+        deadline,
+        probe=limit is not None,
     )
 
 
 async def spin_up_workers[TT: Provider](
-    worker: Callable[[Queue[ITorrent | Message], TT], Coroutine[Any, Any, None]],
+    worker: Callable[[Put, TT], Coroutine[Any, Any, None]],
     providers: list[TT],
-) -> tuple[list[Future[None]], Queue[ITorrent | Message]]:
-    output_queue = Queue[ITorrent | Message]()
-    tasks = [
-        create_monitored_task(worker(output_queue, provider), output_queue.put_nowait)
-        for provider in providers
-    ]
-    return tasks, output_queue
+    deadline: float | None = None,
+    *,
+    probe: bool = False,
+) -> AsyncGenerator[ITorrent | Message]:
+    '''
+    Merges the results of running `worker` for each provider, cancelling
+    those that take longer than their own timeout (not counting time spent
+    waiting for a turn to search or on the reader) or that are still going
+    `deadline` seconds after the search started.
+
+    At most MERGE_BUFFER results are held for the reader, past which the
+    workers wait for it to catch up.
+
+    Searches still running when the reader stops are counted as cancelled,
+    unless it's a `probe`, which stops as soon as it has what it needs.
+    '''
+    # None marks the end of the results
+    queue = Queue[ITorrent | Message | None](MERGE_BUFFER)
+    deadline = search_deadline if deadline is None else deadline
+    ends_at = get_running_loop().time() + deadline
+
+    async def send(event: str, reason: str | Exception) -> None:
+        await queue.put(Message(event, reason, non_null(current_task())))
+
+    # providers still searching
+    running: set[ProviderSource] = set()
+
+    async def budgeted(provider: TT) -> None:
+        seconds = min(provider.timeout, deadline)
+        budget: Timeout | None = None
+        running.add(provider.type)
+        try:
+            async with (
+                timeout_at(ends_at),
+                # only the provider's own time counts against its timeout, not
+                # waiting for its other searches or for the reader
+                provider.searches,
+                timeout(seconds) as budget,
+            ):
+
+                async def put(item: ITorrent | Message) -> None:
+                    if not queue.full():
+                        queue.put_nowait(item)
+                        return
+                    loop = get_running_loop()
+                    when = non_null(budget.when())
+                    budget.reschedule(None)
+                    remaining = when - loop.time()
+                    try:
+                        await queue.put(item)
+                    finally:
+                        if not budget.expired():
+                            budget.reschedule(loop.time() + remaining)
+
+                await worker(put, provider)
+        except CircuitOpen:
+            await send('unavailable', f'{provider.type.value} is unavailable, skipping')
+        except TimeoutError:
+            if budget is not None and budget.expired():
+                breaker_for(provider).failure()
+            else:
+                # the search as a whole ran out of time, which may not be down
+                # to this provider
+                seconds = deadline
+            logger.warning('%s timed out after %ss', provider, seconds)
+            await send('timeout', f'{provider.type.value} timed out after {seconds}s')
+        except Exception as e:
+            await send('err', e)
+            return
+        finally:
+            running.discard(provider.type)
+        await send('exit', 'normal')
+
+    async def produce() -> None:
+        await gather(*(create_task(budgeted(provider)) for provider in providers))
+        await queue.put(None)
+
+    producer = create_task(produce())
+    try:
+        while (item := await queue.get()) is not None:
+            yield item
+    finally:
+        # the reader has gone, so stop searching
+        if not probe:
+            cancelled.update(running)
+        producer.cancel()
+        with suppress(CancelledError):
+            await producer
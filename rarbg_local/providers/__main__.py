@@ -39,9 +39,9 @@ async def main() -> None:
     )
 
     if results.type == MediaType.MOVIE:
-        tasks, queue = await search_for_movie(imdb_id=imdb_id, tmdb_id=tmdb_id)
+        rows = search_for_movie(imdb_id=imdb_id, tmdb_id=tmdb_id)
     elif results.type == MediaType.SERIES:
-        tasks, queue = await search_for_tv(
+        rows = search_for_tv(
             imdb_id=imdb_id,
             tmdb_id=tmdb_id,
             season=IntPrompt.ask('Season?', console=console),
@@ -51,8 +51,7 @@ async def main() -> None:
         logger.info('No results')
         return
 
-    while not all(task.done() for task in tasks):
-        row = await queue.get()
+    async for row in rows:
         if isinstance(row, Message):
             logger.info("message: %s", row)
             continue
@@ -1,28 +1,54 @@
 from abc import ABC, abstractmethod
+from asyncio import Semaphore
 from collections.abc import AsyncGenerator
+from functools import cached_property
+from urllib.parse import urlencode
 
-import aiohttp
 from healthcheck import HealthcheckCallbackResponse, HealthcheckStatus
 
+from ..http_client import get_session
 from ..models import ITorrent, ProviderSource
 from ..types import ImdbId, TmdbId
 
 
 async def check_http(url: str, method: str = 'HEAD') -> HealthcheckCallbackResponse:
-    async with aiohttp.ClientSession() as session:
-        async with session.request(method, url) as response:
-            if response.status == 200:
-                return HealthcheckCallbackResponse(
-                    HealthcheckStatus.PASS, repr(response)
-                )
-            else:
-                return HealthcheckCallbackResponse(
-                    HealthcheckStatus.FAIL, f'Failed to reach {url}: {response.status}'
-                )
+    async with get_session(url).request(method, url) as response:
+        if response.status == 200:
+            return HealthcheckCallbackResponse(HealthcheckStatus.PASS, repr(response))
+        else:
+            return HealthcheckCallbackResponse(
+                HealthcheckStatus.FAIL, f'Failed to reach {url}: {response.status}'
+            )
+
+
+def magnet(info_hash: str, name: str) -> str:
+    """Generate a magnet link from an info hash."""
+    return f'magnet:?xt=urn:btih:{info_hash}&' + urlencode({'dn': name})
 
 
 class Provider(ABC):
     type: ProviderSource
+    # how long search results are kept in the shared cache, in seconds. empty
+    # results are kept for less time, as they're often just a slow upload
+    results_ttl: int = 10 * 60
+    empty_results_ttl: int = 2 * 60
+    # seconds a search may take before being cancelled
+    timeout: float = 20
+    # consecutive failures before searches are skipped, and for how long
+    failure_threshold: int = 3
+    cooldown: float = 60
+    # searches allowed to run at once
+    concurrency: int = 4
+
+    @cached_property
+    def searches(self) -> Semaphore:
+        return Semaphore(self.concurrency)
+
+    async def startup(self) -> None:
+        '''Called once the app has started, before any searches'''
+
+    async def shutdown(self) -> None:
+        '''Called as the app stops'''
 
     @abstractmethod
     async def health(self) -> HealthcheckCallbackResponse:
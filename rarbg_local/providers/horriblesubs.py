@@ -1,19 +1,19 @@
 import re
+import time
 from collections.abc import AsyncGenerator, Iterable
 from enum import Enum
-from functools import lru_cache
 from typing import TYPE_CHECKING, TypedDict
 
 from aiohttp import ClientSession
-from cachetools import TTLCache
 from healthcheck import HealthcheckCallbackResponse
 from lxml.html import fromstring
 
-from ..jikan import closeness, get_names
+from ..http_client import get_session
+from ..jikan import NameIndex, get_names
 from ..models import EpisodeInfo, ITorrent, ProviderSource
+from ..parsing import run_parser
 from ..tmdb import get_tv
 from ..types import ImdbId, TmdbId
-from ..utils import cached
 from .abc import TvProvider, tv_convert
 
 if TYPE_CHECKING:
@@ -24,7 +24,7 @@ ROOT = 'https://horriblesubs.info/'
 
 
 def make_session() -> ClientSession:
-    return ClientSession(base_url=ROOT)
+    return get_session(ROOT)
 
 
 class Result(TypedDict):
@@ -38,26 +38,25 @@ class HorriblesubsDownloadType(Enum):
     BATCH = 'batch'
 
 
-@cached(TTLCache(128, 600))
+def parse_shows(text: str) -> dict[str, str]:
+    shows = fromstring(text).xpath('.//div[@class="ind-show"]/a')
+
+    return {show.attrib['title']: show.attrib['href'] for show in shows}
+
+
 async def get_all_shows() -> dict[str, str]:
-    async with make_session() as session:
-        res = await session.get('/shows/')
+    async with make_session().get('/shows/') as res:
         res.raise_for_status()
         text = await res.text()
-        shows = fromstring(text)
-        shows = shows.xpath('.//div[@class="ind-show"]/a')
+    return await run_parser(parse_shows, text)
 
-        return {show.attrib['title']: show.attrib['href'] for show in shows}
 
-
-@lru_cache
 async def get_show_id(path: str) -> int | None:
-    async with make_session() as session:
-        res = await session.get(path)
+    async with make_session().get(path) as res:
         res.raise_for_status()
         html = await res.text()
-        m = SHOWID_RE.search(html)
-        return int(m.group(1)) if m else None
+    m = SHOWID_RE.search(html)
+    return int(m.group(1)) if m else None
 
 
 def parse(html: 'ElementBase') -> dict[str, str]:
@@ -72,10 +71,9 @@ def parse(html: 'ElementBase') -> dict[str, str]:
 
 
 async def get_latest() -> dict[str, str]:
-    async with make_session() as session:
-        r = await session.get('/api.php', params={'method': 'getlatest'})
+    async with make_session().get('/api.php', params={'method': 'getlatest'}) as r:
         html = fromstring(await r.text())
-        return parse(html)
+    return parse(html)
 
 
 async def get_downloads(
@@ -92,9 +90,7 @@ async def get_downloads(
             break
 
 
-async def _get_downloads(
-    showid: int, type: HorriblesubsDownloadType, page: int
-) -> Iterable[Result]:
+def parse_downloads(text: str) -> list[Result]:
     def process(div: 'ElementBase') -> list[Result]:
         def fn(res: str) -> str | None:
             t = div.xpath(
@@ -113,20 +109,6 @@ async def _get_downloads(
             if fn(resolution)
         ]
 
-    async with make_session() as session:
-        r = await session.get(
-            '/api.php',
-            params={
-                'method': 'getshows',
-                'type': type.value,
-                'showid': showid,
-                'nextid': page,
-            },
-        )
-        text = await r.text()
-        if text.strip() == 'There are no batches for this show yet':
-            return ()
-
     html = fromstring(text)
 
     if html.attrib.get('class') == 'rls-info-container':
@@ -137,45 +119,84 @@ async def _get_downloads(
     return [page for div in torrents for page in process(div)]
 
 
-async def search(showid: int, search_term: str) -> None:
-    async with make_session() as session:
-        await session.get(
-            'api.php',
-            params={
-                'method': 'getshows',
-                'type': 'show',
-                'mode': 'filter',
-                'showid': showid,
-                'value': search_term,
-            },
-        )
-
-
-async def search_for_tv(
-    tmdb_id: TmdbId, season: int, episode: int | None = None
-) -> AsyncGenerator[Result, None]:
-    if season != 1:
-        return
-
-    shows = await get_all_shows()
-
-    names = await get_names(tmdb_id)
+async def _get_downloads(
+    showid: int, type: HorriblesubsDownloadType, page: int
+) -> Iterable[Result]:
+    async with make_session().get(
+        '/api.php',
+        params={
+            'method': 'getshows',
+            'type': type.value,
+            'showid': showid,
+            'nextid': page,
+        },
+    ) as r:
+        text = await r.text()
+    if text.strip() == 'There are no batches for this show yet':
+        return ()
 
-    show = max(shows.keys(), key=lambda key: closeness(key, names) > 95)
-    if closeness(show, names) < 95:
-        return
+    return await run_parser(parse_downloads, text)
 
-    show_id = await get_show_id(shows[show])
-    if not show_id:
-        return
 
-    async for item in get_downloads(show_id, HorriblesubsDownloadType.SHOW):
-        if episode is None or item['episode'] == f'{episode:02d}':
-            yield item
+async def search(showid: int, search_term: str) -> None:
+    async with make_session().get(
+        'api.php',
+        params={
+            'method': 'getshows',
+            'type': 'show',
+            'mode': 'filter',
+            'showid': showid,
+            'value': search_term,
+        },
+    ):
+        pass
 
 
 class HorriblesubsProvider(TvProvider):
     type = ProviderSource.HORRIBLESUBS
+    # seconds the list of shows is kept for
+    shows_ttl = 600
+
+    def __init__(self) -> None:
+        self.shows: dict[str, str] = {}
+        self.shows_index = NameIndex([])
+        self.shows_fetched_at: float | None = None
+        self.show_ids: dict[str, int | None] = {}
+
+    async def get_all_shows(self) -> dict[str, str]:
+        if (
+            self.shows_fetched_at is None
+            or time.monotonic() - self.shows_fetched_at > self.shows_ttl
+        ):
+            self.shows = await get_all_shows()
+            self.shows_index = NameIndex(self.shows)
+            self.shows_fetched_at = time.monotonic()
+        return self.shows
+
+    async def get_show_id(self, path: str) -> int | None:
+        if path not in self.show_ids:
+            self.show_ids[path] = await get_show_id(path)
+        return self.show_ids[path]
+
+    async def search(
+        self, tmdb_id: TmdbId, season: int, episode: int | None = None
+    ) -> AsyncGenerator[Result, None]:
+        if season != 1:
+            return
+
+        shows = await self.get_all_shows()
+
+        show = self.shows_index.match(await get_names(tmdb_id))
+        if show is None:
+            return
+
+        show_id = await self.get_show_id(shows[show])
+        if not show_id:
+            return
+
+        async for item in get_downloads(show_id, HorriblesubsDownloadType.SHOW):
+            if episode is None or item['episode'] == f'{episode:02d}':
+                yield item
 
     async def search_for_tv(
         self,
@@ -187,7 +208,7 @@ class HorriblesubsProvider(TvProvider):
         name = (await get_tv(tmdb_id)).name
         template = f'HorribleSubs {name} S{season:02d}'
 
-        async for item in search_for_tv(tmdb_id, season, episode):
+        async for item in self.search(tmdb_id, season, episode):
             yield ITorrent(
                 source=ProviderSource.HORRIBLESUBS,
                 title=f'{template}E{int(item["episode"], 10):02d} {item["resolution"]}',
@@ -4,11 +4,12 @@ import string
 from collections.abc import AsyncGenerator
 from typing import Any
 
-from aiohttp import ClientSession
 from bs4 import BeautifulSoup, NavigableString, PageElement, Tag
 from healthcheck import HealthcheckCallbackResponse
 
+from ..http_client import get_session
 from ..models import EpisodeInfo, ITorrent, ProviderSource
+from ..parsing import run_parser
 from ..tmdb import get_movie, get_tv
 from ..types import ImdbId, TmdbId
 from .abc import MovieProvider, TvProvider, movie_convert, tv_convert
@@ -22,16 +23,10 @@ def is_node(node: PageElement | Tag | NavigableString | None) -> Tag:
     return node
 
 
-async def fetch(url: str) -> AsyncGenerator[dict[str, Any], None]:
-    async with ClientSession(base_url=ROOT) as session:
-        try:
-            r = await session.get(url)
-        except ConnectionError:
-            logger.exception('Failed to reach kickass')
-            return
-
-        soup = BeautifulSoup(await r.read(), "lxml")
+def parse_page(body: bytes) -> list[dict[str, Any]]:
+    soup = BeautifulSoup(body, "lxml")
 
+    results = []
     for i in soup.find_all(
         'div', {'class': 'tab_content', 'id': lambda id: id != 'comments'}
     ):
@@ -49,16 +44,31 @@ async def fetch(url: str) -> AsyncGenerator[dict[str, Any], None]:
                 row.find('a', {'class': 'torrents_table__torrent_title'})
             ).text
 
-            yield {
-                'title': title.strip(),
-                'magnet': magnet,
-                'resolution': resolution,
-                'seeders': int(
-                    is_node(row.find('td', {'data-title': "Seed"})).text.replace(
-                        ',', ''
-                    )
-                ),
-            }
+            results.append(
+                {
+                    'title': title.strip(),
+                    'magnet': magnet,
+                    'resolution': resolution,
+                    'seeders': int(
+                        is_node(row.find('td', {'data-title': "Seed"})).text.replace(
+                            ',', ''
+                        )
+                    ),
+                }
+            )
+    return results
+
+
+async def fetch(url: str) -> AsyncGenerator[dict[str, Any], None]:
+    try:
+        async with get_session(ROOT).get(url) as r:
+            body = await r.read()
+    except ConnectionError:
+        logger.exception('Failed to reach kickass')
+        return
+
+    for item in await run_parser(parse_page, body):
+        yield item
 
 
 def tokenise(name: str) -> str:
@@ -5,7 +5,6 @@ from datetime import datetime, timezone
 from os.path import exists
 from typing import Annotated, cast
 
-import aiohttp
 from aiocache.base import BaseCache
 from fastapi import Request
 from healthcheck import HealthcheckCallbackResponse, HealthcheckStatus
@@ -13,6 +12,7 @@ from pydantic import BaseModel, BeforeValidator, ConfigDict, Field, PlainSeriali
 from pydantic.types import AwareDatetime
 
 from ..cache import get_cache
+from ..http_client import get_session
 from ..singleton import get, request_var
 from .abc import ImdbId, ITorrent, MovieProvider, ProviderSource, TmdbId
 
@@ -73,10 +73,9 @@ class Schedule(Base):
 
 
 async def get_raw() -> dict:
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as response:
-            response.raise_for_status()
-            return await response.json(content_type=None, encoding='utf-16-le')
+    async with get_session(url).get(url) as response:
+        response.raise_for_status()
+        return await response.json(content_type=None, encoding='utf-16-le')
 
 
 async def get_venue_schedule() -> Schedule:
@@ -1,20 +1,129 @@
+import asyncio
 from collections.abc import AsyncGenerator
+from typing import Any
 
-from fastapi.concurrency import run_in_threadpool
 from healthcheck import HealthcheckCallbackResponse
-from nyaapy.nyaasi.nyaa import Nyaa
-from nyaapy.torrent import Torrent
+from lxml import html
+from pydantic import BaseModel
 from sentry_sdk import trace
 
+from ..http_client import get_session
 from ..models import EpisodeInfo, ITorrent, ProviderSource
+from ..parsing import run_parser
 from ..tmdb import get_tv
 from ..types import ImdbId, TmdbId
-from ..utils import format_marker
-from .abc import TvProvider, tv_convert
+from ..utils import format_marker, non_null
+from . import infohash
+from .abc import TvProvider, magnet, tv_convert
+
+# pages requested ahead of the ones we've received
+PAGE_CONCURRENCY = 3
+MAX_PAGES = 20
+
+
+class NyaaTorrent(BaseModel):
+    name: str
+    info_hash: str
+    seeders: int
+    category: str
+
+
+def parse_listing(body: bytes) -> list[dict[str, Any]]:
+    '''
+    Parses a page of nyaa's HTML listing. The RSS view ignores the page asked
+    for, so can't be paged through
+    '''
+    root = html.fromstring(body)
+    results = []
+    for row in root.xpath('//table[contains(@class, "torrent-list")]/tbody/tr'):
+        category, name, links, _size, _date, seeders, *_ = row.iterfind('td')
+        title = name.xpath('a[not(contains(@class, "comments"))]')[-1]
+        (link,) = links.xpath('a[starts-with(@href, "magnet:")]/@href')
+        results.append(
+            {
+                'name': title.get('title') or title.text_content().strip(),
+                'info_hash': non_null(infohash(link)),
+                'seeders': int(seeders.text_content().strip() or 0),
+                'category': category.find('a').get('title') or '',
+            }
+        )
+    return results
 
 
 class NyaaProvider(TvProvider):
     type = ProviderSource.NYAA_SI
+    root = 'https://nyaa.si/'
+
+    @trace
+    async def page(self, keyword: str, page: int) -> list[NyaaTorrent]:
+        async with get_session(self.root).get(
+            self.root,
+            params={
+                'f': 0,
+                'c': '0_0',
+                'q': keyword,
+                'p': page,
+                's': 'id',
+                'o': 'desc',
+            },
+        ) as res:
+            # nyaa 404s for pages past the end of the results
+            if res.status == 404:
+                return []
+            res.raise_for_status()
+            items = await run_parser(parse_listing, await res.read())
+        return [NyaaTorrent.model_validate(item) for item in items]
+
+    async def pages(self, keyword: str) -> AsyncGenerator[list[NyaaTorrent]]:
+        '''
+        Yields the new results from each page as it arrives, requesting pages
+        ahead of time and stopping at (and cancelling anything after) the
+        first page without any
+        '''
+        pending: dict[asyncio.Task[list[NyaaTorrent]], int] = {}
+        next_page = 1
+        # the first page known to have nothing new
+        last: int | None = None
+        seen: set[str] = set()
+
+        try:
+            while True:
+                while (
+                    last is None
+                    and len(pending) < PAGE_CONCURRENCY
+                    and next_page <= MAX_PAGES
+                ):
+                    task = asyncio.create_task(self.page(keyword, next_page))
+                    pending[task] = next_page
+                    next_page += 1
+
+                if not pending:
+                    return
+
+                done, _ = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in sorted(done, key=pending.__getitem__):
+                    page = pending.pop(task)
+                    if task.cancelled() or (last is not None and page > last):
+                        continue
+
+                    items = [
+                        item for item in task.result() if item.info_hash not in seen
+                    ]
+                    if items:
+                        seen.update(item.info_hash for item in items)
+                        yield items
+                        continue
+
+                    last = page
+                    for later, later_page in pending.items():
+                        if later_page > last:
+                            later.cancel()
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
 
     async def search_for_tv(
         self,
@@ -23,28 +132,16 @@ class NyaaProvider(TvProvider):
         season: int,
         episode: int | None = None,
     ) -> AsyncGenerator[ITorrent, None]:
-        ny = Nyaa()
-
         name = (await get_tv(tmdb_id)).name
-        page = 0
-        template = f'{name} ' + format_marker(season, episode)
-
-        def search() -> list[Torrent]:
-            return trace(ny.search)(keyword=template, page=page)
-
-        while True:
-            items = await run_in_threadpool(search)
-            if items:
-                page += 1
-            else:
-                break
+        keyword = f'{name} ' + format_marker(season, episode)
 
+        async for items in self.pages(keyword):
             for item in items:
                 yield ITorrent(
                     source=ProviderSource.NYAA_SI,
                     title=item.name,
                     seeders=item.seeders,
-                    download=item.magnet,
+                    download=magnet(item.info_hash, item.name),
                     category=tv_convert(item.category),
                     episode_info=EpisodeInfo(seasonnum=season, epnum=episode),
                 )
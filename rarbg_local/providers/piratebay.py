@@ -1,16 +1,15 @@
 import logging
 from collections.abc import AsyncGenerator
 from contextlib import asynccontextmanager
-from urllib.parse import urlencode
 
-import aiohttp
 from healthcheck import HealthcheckCallbackResponse
-from pydantic import BaseModel, TypeAdapter
+from pydantic import BaseModel
 
+from ..http_client import get_session
 from ..models import EpisodeInfo, ITorrent, ProviderSource
 from ..types import ImdbId, TmdbId
-from ..utils import format_marker
-from .abc import MovieProvider, TvProvider
+from ..utils import format_marker, type_adapter
+from .abc import MovieProvider, TvProvider, magnet
 
 logger = logging.getLogger(__name__)
 
@@ -51,11 +50,6 @@ def convert_category(category: int) -> str:
     return message
 
 
-def magnet(info_hash: str, name: str) -> str:
-    """Generate a magnet link from an info hash."""
-    return f'magnet:?xt=urn:btih:{info_hash}&' + urlencode({'dn': name})
-
-
 class PirateTorrent(BaseModel):
     name: str
     info_hash: str
@@ -69,12 +63,9 @@ class PirateBayProvider(TvProvider, MovieProvider):
 
     @asynccontextmanager
     async def search(self, q: str) -> AsyncGenerator[list[PirateTorrent]]:
-        async with (
-            aiohttp.ClientSession() as session,
-            await session.get(self.root, params={'q': q}) as resp,
-        ):
+        async with get_session(self.root).get(self.root, params={'q': q}) as resp:
             resp.raise_for_status()
-            data = TypeAdapter(list[PirateTorrent]).validate_python(await resp.json())
+            data = type_adapter(list[PirateTorrent]).validate_json(await resp.read())
 
             if len(data) == 1 and data[0].name == 'No results returned':
                 yield []
@@ -2,14 +2,17 @@ import json
 from datetime import datetime
 from typing import Annotated, Any
 
-import aiohttp
+import orjson
 from fastapi import Request
 from pydantic import BaseModel, GetCoreSchemaHandler, ValidatorFunctionWrapHandler
 from pydantic_core import CoreSchema, core_schema
 from rich import print
 
+from ..http_client import get_session
 from .geolocate import resolve_location
 
+ROOT = 'https://serpapi.com/'
+
 
 class HumanDate:
     def tz_constraint_validator(
@@ -58,18 +61,17 @@ class SearchResult(BaseModel):
 
 
 async def search(movie_name: str, location: str, iso_code: str, api_key: str) -> dict:
-    async with aiohttp.ClientSession() as session:
-        res = await session.get(
-            'https://serpapi.com/search.json',
-            params={
-                'q': f'{movie_name} show times',
-                'location': location,
-                'hl': 'en',
-                'gl': iso_code,
-                'api_key': api_key,
-            },
-        )
-        js = await res.json()
+    async with get_session(ROOT).get(
+        ROOT + 'search.json',
+        params={
+            'q': f'{movie_name} show times',
+            'location': location,
+            'hl': 'en',
+            'gl': iso_code,
+            'api_key': api_key,
+        },
+    ) as res:
+        js = await res.json(loads=orjson.loads)
         res.raise_for_status()
         return js
 
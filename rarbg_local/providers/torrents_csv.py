@@ -1,13 +1,14 @@
 from collections.abc import AsyncGenerator
 from typing import Any
 
-import aiohttp
+import orjson
 from healthcheck import HealthcheckCallbackResponse
 
+from ..http_client import get_session
 from ..models import ITorrent, ProviderSource
 from ..types import ImdbId, TmdbId
 from ..utils import format_marker
-from .abc import MovieProvider, TvProvider
+from .abc import MovieProvider, TvProvider, magnet
 
 
 class TorrentsCsvProvider(MovieProvider, TvProvider):
@@ -15,10 +16,11 @@ class TorrentsCsvProvider(MovieProvider, TvProvider):
     root = 'https://torrents-csv.com'
 
     async def query(self, q: str) -> list[dict[str, Any]]:
-        async with aiohttp.ClientSession() as session:
-            res = await session.get(self.root + "/service/search", params={"q": q})
+        async with get_session(self.root).get(
+            self.root + "/service/search", params={"q": q}
+        ) as res:
             res.raise_for_status()
-            return (await res.json())['torrents']
+            return (await res.json(loads=orjson.loads))['torrents']
 
     async def search_for_movie(
         self, imdb_id: ImdbId, tmdb_id: TmdbId
@@ -28,7 +30,7 @@ class TorrentsCsvProvider(MovieProvider, TvProvider):
                 source=ProviderSource.TORRENTS_CSV,
                 title=item['name'],
                 seeders=item['seeders'],
-                download=item['infohash'],
+                download=magnet(item['infohash'], item['name']),
                 category=item['category'],
             )
 
@@ -40,7 +42,7 @@ class TorrentsCsvProvider(MovieProvider, TvProvider):
                 source=ProviderSource.TORRENTS_CSV,
                 title=item['name'],
                 seeders=item['seeders'],
-                download=item['infohash'],
+                download=magnet(item['infohash'], item['name']),
                 category=item['category'],
             )
 
@@ -0,0 +1,55 @@
+from collections.abc import AsyncGenerator, AsyncIterable
+from heapq import heappush, heapreplace
+from itertools import count
+from typing import Literal
+
+from .models import ITorrent, RankedUpdate
+
+RankBy = Literal['seeders', 'resolution', 'pack']
+
+
+def score(torrent: ITorrent, rank_by: RankBy) -> tuple[int, ...]:
+    match rank_by:
+        case 'seeders':
+            return (torrent.seeders,)
+        case 'resolution':
+            return (torrent.release.resolution or 0, torrent.seeders)
+        case 'pack':
+            return (torrent.release.pack, torrent.seeders)
+
+
+class TopK:
+    '''
+    Keeps the best `k` torrents seen so far, ties going to whichever arrived
+    first
+    '''
+
+    def __init__(self, k: int, rank_by: RankBy = 'seeders') -> None:
+        self.k = k
+        self.rank_by = rank_by
+        # a min heap, so the worst of the top k is always at the front
+        self.heap: list[tuple[tuple[int, ...], int, ITorrent]] = []
+        self.order = count()
+
+    def add(self, torrent: ITorrent) -> RankedUpdate | None:
+        '''Returns what changed in the top k, if anything'''
+        entry = (score(torrent, self.rank_by), -next(self.order), torrent)
+        if len(self.heap) < self.k:
+            heappush(self.heap, entry)
+            return RankedUpdate(inserted=torrent)
+        if entry[:2] < self.heap[0][:2]:
+            return None
+        evicted = heapreplace(self.heap, entry)[2]
+        return RankedUpdate(inserted=torrent, evicted=evicted)
+
+    def ranked(self) -> list[ITorrent]:
+        return [entry[2] for entry in sorted(self.heap, reverse=True)]
+
+
+async def top_k(
+    results: AsyncIterable[ITorrent], k: int, rank_by: RankBy = 'seeders'
+) -> AsyncGenerator[RankedUpdate]:
+    top = TopK(k, rank_by)
+    async for result in results:
+        if update := top.add(result):
+            yield update
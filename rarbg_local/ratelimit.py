@@ -0,0 +1,129 @@
+import asyncio
+import time
+from collections.abc import Generator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from enum import IntEnum
+from heapq import heappop, heappush
+from itertools import count
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+
+priority_var = ContextVar('priority_var', default=Priority.INTERACTIVE)
+
+
+@contextmanager
+def background() -> Generator[None]:
+    '''
+    Marks rate limited calls made within this block as background work, to be
+    served after any interactive calls that are waiting
+    '''
+    token = priority_var.set(Priority.BACKGROUND)
+    try:
+        yield
+    finally:
+        priority_var.reset(token)
+
+
+@dataclass
+class WaitStats:
+    count: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+
+    def record(self, wait: float) -> None:
+        self.count += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+
+
+@dataclass(order=True)
+class Waiter:
+    priority: Priority
+    seq: int
+    future: asyncio.Future[None] = field(compare=False)
+
+
+class RateLimiter:
+    '''
+    A token bucket, allowing `rate` calls per second with bursts of up to
+    `burst` calls. Waiting calls are served in priority order.
+    '''
+
+    def __init__(self, rate: float, burst: int | None = None) -> None:
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self.reset()
+
+    def reset(self) -> None:
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.waiters: list[Waiter] = []
+        self.seq = count()
+        self.dispatcher: asyncio.Task[None] | None = None
+        self.stats = {priority: WaitStats() for priority in Priority}
+
+    def pause(self, seconds: float) -> None:
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def delay(self) -> float:
+        '''Seconds until the next token is available'''
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    async def acquire(self, priority: Priority | None = None) -> None:
+        if priority is None:
+            priority = priority_var.get()
+        start = time.monotonic()
+
+        if not self.waiters and self.delay() == 0:
+            self.tokens -= 1
+        else:
+            loop = asyncio.get_running_loop()
+            waiter = Waiter(priority, next(self.seq), loop.create_future())
+            heappush(self.waiters, waiter)
+            if (
+                self.dispatcher is None
+                or self.dispatcher.done()
+                or self.dispatcher.get_loop() is not loop
+            ):
+                self.dispatcher = loop.create_task(self.dispatch())
+            await waiter.future
+
+        self.stats[priority].record(time.monotonic() - start)
+
+    async def dispatch(self) -> None:
+        while self.waiters:
+            if delay := self.delay():
+                await asyncio.sleep(delay)
+                continue
+
+            waiter = heappop(self.waiters)
+            if not waiter.future.done():  # ie, cancelled
+                self.tokens -= 1
+                waiter.future.set_result(None)
+
+    def info(self) -> dict[str, object]:
+        return {
+            'rate': self.rate,
+            'burst': self.burst,
+            'paused_for': max(0.0, self.paused_until - time.monotonic()),
+            'waiting': len(self.waiters),
+            'wait': {
+                priority.name.lower(): asdict(stats)
+                for priority, stats in self.stats.items()
+            },
+        }
@@ -0,0 +1,87 @@
+import re
+
+from pydantic import BaseModel, ConfigDict
+
+from .utils import lru_cache
+
+# the parts of a release name we care about, in one pattern so that a title
+# is only scanned once, whichever of them it has
+release_re = re.compile(
+    r'''
+    (?<![a-z0-9])
+    (?P<marker>S(?P<season>\d{2})(?:E(?P<episode>\d{2})(?:-?E(?P<last>\d{2}))?)?)
+    (?:v\d)?(?![a-z0-9])
+    | \b(?:(?P<resolution>\d{3,4})[pi]|(?P<uhd>4k|uhd))\b
+    | \b(?P<codec>[xh]\.?26[45]|hevc|avc|xvid|av1)\b
+    | \b(?P<source>web-?dl|web-?rip|web|blu-?ray|bd-?rip|br-?rip|hdtv|dvd-?rip|remux)\b
+    | -(?P<group>[a-z0-9]+)(?:\[[^\]]*\])?$
+    ''',
+    re.I | re.X,
+)
+
+
+class Release(BaseModel):
+    '''What a torrent's title says about it'''
+
+    # shared between everything with the same title, by parse_release's cache
+    model_config = ConfigDict(frozen=True)
+
+    season: int | None = None
+    episode: int | None = None
+    # the last episode, for ranges like S01E01-E03
+    last_episode: int | None = None
+    # the episode marker as it appears in the title, ie S01E02
+    marker: str | None = None
+    resolution: int | None = None
+    codec: str | None = None
+    source: str | None = None
+    group: str | None = None
+
+    @property
+    def pack(self) -> bool:
+        '''Whether this is a whole season, rather than specific episodes'''
+        return self.season is not None and self.episode is None
+
+
+@lru_cache(4096)
+def parse_release(title: str) -> Release:
+    season: int | None = None
+    episode: int | None = None
+    last_episode: int | None = None
+    marker: str | None = None
+    resolution: int | None = None
+    codec: str | None = None
+    source: str | None = None
+    group: str | None = None
+
+    for match in release_re.finditer(title):
+        match match.lastgroup:
+            # the first episode marker wins, or else the first bare season
+            case 'marker' if episode is None and (season is None or match['episode']):
+                season = int(match['season'])
+                if match['episode']:
+                    episode = int(match['episode'])
+                    marker = title[match.start() : match.end('episode')]
+                if match['last']:
+                    last_episode = int(match['last'])
+            case 'resolution' if resolution is None:
+                resolution = int(match['resolution'])
+            case 'uhd' if resolution is None:
+                resolution = 2160
+            case 'codec' if codec is None:
+                codec = match['codec'].lower().replace('.', '')
+            case 'source' if source is None:
+                source = match['source'].lower().replace('-', '')
+            case 'group':
+                group = match['group']
+
+    return Release(
+        season=season,
+        episode=episode,
+        last_episode=last_episode,
+        marker=marker,
+        resolution=resolution,
+        codec=codec,
+        source=source,
+        group=group,
+    )
@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import re
+from bisect import bisect_left, insort
+from collections import defaultdict
+from collections.abc import Iterable
+
+from .models import SearchResponse
+from .tmdb import search_themoviedb
+from .types import TmdbId
+
+logger = logging.getLogger(__name__)
+
+type Key = tuple[str, TmdbId]
+
+# how similar (by shared trigrams) a title must be to match a misspelt query
+MIN_SIMILARITY = 0.3
+
+non_word_re = re.compile(r'[\W_]+')
+
+
+def normalise(title: str) -> str:
+    return ' '.join(non_word_re.sub(' ', title.casefold()).split())
+
+
+def trigrams(text: str) -> set[str]:
+    padded = f'  {text} '
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class TitleIndex:
+    '''
+    An in memory index of titles, answering prefix (of any word in a title)
+    and typo tolerant queries without a TMDB round trip
+    '''
+
+    def __init__(self) -> None:
+        self.clear()
+
+    def clear(self) -> None:
+        self.entries: dict[Key, SearchResponse] = {}
+        self.titles: dict[Key, str] = {}
+        # every suffix of each title starting at a word boundary, sorted
+        self.prefixes: list[tuple[str, Key]] = []
+        self.trigrams: defaultdict[str, set[Key]] = defaultdict(set)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def add(self, result: SearchResponse) -> None:
+        key = (result.type.value, result.tmdb_id)
+        existing = self.entries.get(key)
+        # keep what we know of the year, as library titles don't have one
+        if existing and result.year is None:
+            result = result.model_copy(update={'year': existing.year})
+        self.entries[key] = result
+
+        title = normalise(result.title)
+        if self.titles.get(key) == title:
+            return
+        if key in self.titles:
+            self.remove(key)
+        self.titles[key] = title
+
+        words = title.split(' ')
+        for i in range(len(words)):
+            insort(self.prefixes, (' '.join(words[i:]), key))
+        for trigram in trigrams(title):
+            self.trigrams[trigram].add(key)
+
+    def update(self, results: Iterable[SearchResponse]) -> None:
+        for result in results:
+            self.add(result)
+
+    def remove(self, key: Key) -> None:
+        title = self.titles.pop(key)
+        self.prefixes = [entry for entry in self.prefixes if entry[1] != key]
+        for trigram in trigrams(title):
+            self.trigrams[trigram].discard(key)
+
+    def search(self, query: str, limit: int = 10) -> list[SearchResponse]:
+        query = normalise(query)
+        if not query:
+            return []
+
+        # prefix matches rank above anything else, shortest titles first
+        matches: dict[Key, tuple[int, float]] = {}
+
+        i = bisect_left(self.prefixes, (query,))
+        while i < len(self.prefixes) and self.prefixes[i][0].startswith(query):
+            key = self.prefixes[i][1]
+            matches[key] = (1, -len(self.titles[key]))
+            i += 1
+
+        wanted = trigrams(query)
+        shared: defaultdict[Key, int] = defaultdict(int)
+        for trigram in wanted:
+            for key in self.trigrams.get(trigram, ()):
+                shared[key] += 1
+        for key, count in shared.items():
+            if key in matches:
+                continue
+            similarity = count / len(wanted | trigrams(self.titles[key]))
+            if similarity >= MIN_SIMILARITY:
+                matches[key] = (0, similarity)
+
+        ranked = sorted(matches, key=lambda key: matches[key], reverse=True)
+        return [self.entries[key] for key in ranked[:limit]]
+
+
+title_index = TitleIndex()
+
+
+_pending: set[asyncio.Future[list[SearchResponse]]] = set()
+
+
+async def search_remote(query: str) -> list[SearchResponse]:
+    results = await search_themoviedb(query)
+    title_index.update(results)
+    return results
+
+
+def _topped_up(future: asyncio.Future[list[SearchResponse]]) -> None:
+    _pending.discard(future)
+    if not future.cancelled() and (exc := future.exception()):
+        logger.warning('Unable to top up search index', exc_info=exc)
+
+
+def top_up(query: str) -> None:
+    '''Searches TMDB in the background, adding the results to the index'''
+    future = asyncio.ensure_future(search_remote(query))
+    _pending.add(future)
+    future.add_done_callback(_topped_up)
@@ -6,6 +6,8 @@ from pydantic_settings import BaseSettings
 
 from .singleton import singleton
 
+DEFAULT_PROVIDERS = ['torrentscsv', 'nyaasi', 'piratebay']
+
 
 class Settings(BaseSettings):
     root: Path = Path(__file__).parent.parent.absolute()
@@ -17,6 +19,12 @@ class Settings(BaseSettings):
         'memory://'
     )
     statsig_key: SecretStr
+    # the ProviderSource values to search with
+    providers: list[str] = DEFAULT_PROVIDERS
+    # overrides the number of concurrent searches allowed per provider
+    provider_concurrency: dict[str, int] = {}
+    # processes to parse scraped pages in, or 0 to parse them in threads
+    parse_processes: int = 2
 
 
 @singleton
@@ -1,5 +1,6 @@
 import json
-from collections.abc import AsyncGenerator, Generator
+from asyncio import sleep
+from collections.abc import AsyncGenerator, Callable, Generator
 from pathlib import Path
 from re import Pattern
 from typing import Annotated, Any, Protocol, runtime_checkable
@@ -10,6 +11,7 @@ from aioresponses import aioresponses as Aioresponses
 from async_asgi_testclient import TestClient
 from fastapi import Depends, FastAPI
 from fastapi.security import SecurityScopes
+from healthcheck import HealthcheckCallbackResponse, HealthcheckStatus
 from pydantic import SecretStr
 from pytest import fixture
 from pytest_snapshot.plugin import Snapshot
@@ -26,12 +28,18 @@ from ..db import (
     get_async_db,
     get_async_sessionmaker,
 )
+from ..models import ITorrent, ProviderSource
 from ..new import (
     Settings,
     create_app,
     get_settings,
 )
+from ..providers import breakers, cancelled
+from ..providers.abc import TvProvider
+from ..search_index import title_index
 from ..singleton import get
+from ..tmdb import limiter
+from ..types import ImdbId, TmdbId
 from ..utils import cache_clear
 from .factories import session_var
 
@@ -44,6 +52,10 @@ def event_loop_policy() -> uvloop.EventLoopPolicy:
 @fixture
 def fastapi_app(tmp_path: Path) -> FastAPI:
     cache_clear()
+    limiter.reset()
+    title_index.clear()
+    breakers.clear()
+    cancelled.clear()
     app = create_app()
     app.dependency_overrides[get_settings] = lambda: Settings(
         database_url=str(
@@ -171,6 +183,70 @@ def aioresponses() -> Generator[Aioresponses, None, None]:
         yield e
 
 
+class FakeProvider(TvProvider):
+    '''
+    Yields `results` for any search, waiting `delay` seconds after each one,
+    or raises `error` instead
+    '''
+
+    type = ProviderSource.TORRENTS_CSV
+
+    def __init__(
+        self,
+        results: list[ITorrent],
+        delay: float = 0,
+        error: Exception | None = None,
+    ) -> None:
+        self.results = results
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    async def health(self) -> HealthcheckCallbackResponse:
+        return HealthcheckCallbackResponse(HealthcheckStatus.PASS, 'all good')
+
+    async def search_for_tv(
+        self,
+        imdb_id: ImdbId,
+        tmdb_id: TmdbId,
+        season: int,
+        episode: int | None = None,
+    ) -> AsyncGenerator[ITorrent, None]:
+        self.calls += 1
+        if self.error:
+            raise self.error
+        for result in self.results:
+            yield result
+            if self.delay:
+                await sleep(self.delay)
+
+
+MakeProvider = Callable[..., FakeProvider]
+
+
+@fixture
+def fake_provider() -> MakeProvider:
+    '''
+    Makes FakeProviders, with any class attributes (type, timeout, etc)
+    given as keywords, starting from closed breakers and no cancellations
+    '''
+    breakers.clear()
+    cancelled.clear()
+
+    def make(
+        results: list[ITorrent] | None = None,
+        delay: float = 0,
+        error: Exception | None = None,
+        **attributes: Any,
+    ) -> FakeProvider:
+        provider = FakeProvider(results or [], delay, error)
+        for name, value in attributes.items():
+            setattr(provider, name, value)
+        return provider
+
+    return make
+
+
 async def tolist[T](a: AsyncGenerator[T, None]) -> list[T]:
     lst: list[T] = []
     async for t in a:
@@ -5,11 +5,13 @@ from aioresponses import aioresponses as Aioresponses
 from pytest import fixture, mark
 from pytest_snapshot.plugin import Snapshot
 
+from ...jikan import NameIndex
 from ...providers.horriblesubs import (
     HorriblesubsDownloadType,
     HorriblesubsProvider,
     get_downloads,
     get_latest,
+    parse_shows,
 )
 from ...types import ImdbId, TmdbId
 from ..conftest import add_json, assert_match_json, themoviedb, tolist
@@ -161,3 +163,15 @@ async def test_provider(
     ]
 
     assert_match_json(snapshot, results, 'results.json')
+
+
+def test_name_index(resource_path: Path) -> None:
+    shows = parse_shows(
+        (resource_path / '../test_provider/shows.html').resolve().read_text()
+    )
+    index = NameIndex(shows)
+
+    assert index.match(['Busters that are little', 'little busters!']) == (
+        'Little Busters!'
+    )
+    assert index.match(['Something else entirely']) is None
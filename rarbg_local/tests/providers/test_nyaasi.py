@@ -0,0 +1,73 @@
+from aioresponses import aioresponses as Aioresponses
+from pytest import mark
+from yarl import URL
+
+from ...models import ITorrent, ProviderSource
+from ...providers.nyaasi import NyaaProvider
+from ...types import ImdbId, TmdbId
+from ..conftest import themoviedb, tolist
+from ..factories import TvApiResponseFactory
+
+
+def listing(*names: tuple[int, str]) -> str:
+    rows = ''.join(
+        f'''
+        <tr class="default">
+            <td><a href="/?c=1_2" title="Anime - English-translated"></a></td>
+            <td colspan="2">
+                <a href="/view/{i}#comments" class="comments">2</a>
+                <a href="/view/{i}" title="{name}">{name}</a>
+            </td>
+            <td class="text-center">
+                <a href="/download/{i}.torrent"><i class="fa fa-fw fa-download"></i></a>
+                <a href="magnet:?xt=urn:btih:{i:040x}&amp;dn={name}"></a>
+            </td>
+            <td class="text-center">1.2 GiB</td>
+            <td class="text-center">2020-01-01 00:00</td>
+            <td class="text-center">{i}</td>
+            <td class="text-center">0</td>
+            <td class="text-center">10</td>
+        </tr>
+        '''
+        for i, name in names
+    )
+    return f'''<!DOCTYPE html>
+<html><body>
+    <table class="table torrent-list"><tbody>{rows}</tbody></table>
+</body></html>'''
+
+
+def page_url(page: int) -> URL:
+    return URL('https://nyaa.si/').with_query(
+        f=0, c='0_0', q='Little Busters S01E01', p=page, s='id', o='desc'
+    )
+
+
+@mark.asyncio
+async def test_search_for_tv(aioresponses: Aioresponses, clear_cache: None) -> None:
+    themoviedb(
+        aioresponses,
+        '/tv/1',
+        TvApiResponseFactory.create(name='Little Busters').model_dump(),
+    )
+    aioresponses.get(page_url(1), body=listing((1, 'first')))
+    aioresponses.get(page_url(2), body=listing((2, 'second'), (3, 'third')))
+    # a new upload pushed the last result onto the next page
+    aioresponses.get(page_url(3), body=listing((3, 'third')))
+    aioresponses.get(page_url(4), status=404)
+
+    res = await tolist(
+        NyaaProvider().search_for_tv(ImdbId('tt0000000'), TmdbId(1), 1, 1)
+    )
+
+    assert sorted(item.title for item in res) == ['first', 'second', 'third']
+    assert next(item for item in res if item.title == 'first') == ITorrent(
+        source=ProviderSource.NYAA_SI,
+        title='first',
+        seeders=1,
+        download=f'magnet:?xt=urn:btih:{1:040x}&dn=first',
+        category='Anime - English-translated',
+        episode_info={'seasonnum': 1, 'epnum': 1},
+    )
+    # nothing after the first page without any new results
+    assert page_url(5) not in {url for _, url in aioresponses.requests}
@@ -0,0 +1,269 @@
+from asyncio import create_task, sleep, wait_for
+from contextlib import aclosing
+
+from aiocache import Cache
+from pydantic import SecretStr
+from pytest import MonkeyPatch, mark
+
+from ...breaker import BreakerState
+from ...cache import CompactSerializer
+from ...models import ITorrent, ProviderSource
+from ...providers import (
+    MERGE_BUFFER,
+    Deduplicator,
+    Put,
+    breakers,
+    cancelled,
+    forward,
+    get_providers,
+    infohash,
+    provider_registry,
+    results_key,
+    search_tv,
+    spin_up_workers,
+)
+from ...providers.abc import Provider, TvProvider
+from ...settings import Settings
+from ...types import ImdbId, TmdbId
+from ...utils import Message, set_shared_cache
+from ..conftest import MakeProvider, tolist
+from ..factories import ITorrentFactory
+
+
+@mark.asyncio
+async def test_cached_results(fake_provider: MakeProvider) -> None:
+    shared = Cache(Cache.MEMORY, serializer=CompactSerializer())
+    set_shared_cache(shared)
+    try:
+        imdb_id, tmdb_id = ImdbId('tt0000001'), TmdbId(1)
+        results = ITorrentFactory.build_batch(2, source=ProviderSource.TORRENTS_CSV)
+        provider = fake_provider(results)
+
+        # not cached when the consumer stops early
+        async for _ in search_tv(provider, imdb_id, tmdb_id, 1, 1):
+            break
+        assert not await shared.exists(results_key(provider, imdb_id, 1, 1))
+
+        assert await tolist(search_tv(provider, imdb_id, tmdb_id, 1, 1)) == results
+        assert await tolist(search_tv(provider, imdb_id, tmdb_id, 1, 1)) == results
+        assert provider.calls == 2
+
+        await tolist(search_tv(provider, imdb_id, tmdb_id, 1, 1, fresh=True))
+        assert provider.calls == 3
+
+        # empty results are cached too, just not for as long
+        empty = fake_provider([])
+        assert await tolist(search_tv(empty, imdb_id, tmdb_id, 1, 2)) == []
+        assert await tolist(search_tv(empty, imdb_id, tmdb_id, 1, 2)) == []
+        assert empty.calls == 1
+        assert await shared.exists(results_key(empty, imdb_id, 1, 2))
+    finally:
+        set_shared_cache(None)
+        await shared.close()
+
+
+@mark.asyncio
+async def test_spin_up_workers_timeout(fake_provider: MakeProvider) -> None:
+    slow = fake_provider(
+        ITorrentFactory.build_batch(2),
+        delay=1,
+        type=ProviderSource.NYAA_SI,
+        timeout=0.05,
+    )
+    fast = fake_provider(ITorrentFactory.build_batch(2))
+
+    async def worker(put: Put, provider: TvProvider) -> None:
+        async for result in provider.search_for_tv(ImdbId('tt0000001'), TmdbId(1), 1):
+            await put(result)
+
+    items = await tolist(spin_up_workers(worker, [slow, fast], deadline=1))
+
+    assert [item for item in items if isinstance(item, ITorrent)] == [
+        slow.results[0],
+        *fast.results,
+    ]
+    (timeout,) = [
+        item for item in items if isinstance(item, Message) and item.event == 'timeout'
+    ]
+    assert timeout.reason == 'nyaasi timed out after 0.05s'
+
+
+@mark.asyncio
+async def test_spin_up_workers_waiting(fake_provider: MakeProvider) -> None:
+    provider = fake_provider(
+        ITorrentFactory.build_batch(MERGE_BUFFER * 2), timeout=0.05, concurrency=1
+    )
+
+    async def worker(put: Put, provider: TvProvider) -> None:
+        async for result in provider.search_for_tv(ImdbId('tt0000001'), TmdbId(1), 1):
+            await put(result)
+
+    # neither waiting for a turn to search, nor for a slow reader, counts
+    # against the provider's timeout
+    results = spin_up_workers(worker, [provider])
+    async with provider.searches:
+        first = create_task(anext(results))
+        await sleep(0.1)
+    items = [await first]
+    await sleep(0.1)
+    items += await tolist(results)
+
+    assert [item for item in items if isinstance(item, ITorrent)] == provider.results
+    assert [item.event for item in items if isinstance(item, Message)] == ['exit']
+    assert provider.type not in breakers
+
+    # but the search as a whole still ends on time
+    async with provider.searches:
+        items = await wait_for(
+            tolist(spin_up_workers(worker, [provider], deadline=0.1)), 1
+        )
+
+    timeout, end = items
+    assert isinstance(timeout, Message)
+    assert isinstance(end, Message)
+    assert [timeout.event, end.event] == ['timeout', 'exit']
+    assert timeout.reason == 'torrentscsv timed out after 0.1s'
+    assert provider.type not in breakers
+
+
+@mark.asyncio
+async def test_spin_up_workers_backpressure(fake_provider: MakeProvider) -> None:
+    provider = fake_provider(ITorrentFactory.build_batch(MERGE_BUFFER * 2))
+    sent = 0
+
+    async def worker(put: Put, provider: TvProvider) -> None:
+        nonlocal sent
+        async for result in provider.search_for_tv(ImdbId('tt0000001'), TmdbId(1), 1):
+            await put(result)
+            sent += 1
+
+    results = spin_up_workers(worker, [provider])
+    first = await anext(results)
+    await sleep(0.01)
+    # the worker is held up by the reader, rather than racing ahead
+    assert sent <= MERGE_BUFFER + 1
+
+    await results.aclose()
+    assert first == provider.results[0]
+    assert sent < len(provider.results)
+    # the reader went away before the provider was done
+    assert cancelled[provider.type] == 1
+
+
+@mark.asyncio
+async def test_probe(fake_provider: MakeProvider) -> None:
+    slow = fake_provider(delay=1, type=ProviderSource.NYAA_SI, timeout=10)
+    fast = fake_provider(ITorrentFactory.build_batch(3))
+    sent: list[ITorrent | Message] = []
+
+    async def put(item: ITorrent | Message) -> None:
+        sent.append(item)
+
+    await forward(fast.search_for_tv(ImdbId('tt0000001'), TmdbId(1), 1), put, limit=1)
+    assert sent == fast.results[:1]
+
+    async def worker(put: Put, provider: TvProvider) -> None:
+        results = provider.search_for_tv(ImdbId('tt0000001'), TmdbId(1), 1)
+        await forward(results, put, limit=2)
+
+    slow.results = ITorrentFactory.build_batch(2)
+    async with aclosing(spin_up_workers(worker, [fast, slow], probe=True)) as results:
+        first = await anext(results)
+    assert first == fast.results[0]
+    # slow was still waiting on its second result, but the probe had its
+    # answer, so it wasn't counted as cancelled
+    assert not cancelled
+
+
+@mark.parametrize(
+    'download',
+    [
+        'magnet:?xt=urn:btih:0123456789ABCDEF0123456789ABCDEF01234567&dn=Show',
+        'magnet:?dn=Show&xt=urn:btih:AERUKZ4JVPG66AJDIVTYTK6N54ASGRLH',
+        '0123456789abcdef0123456789abcdef01234567',
+        'https://example.com/download/0123456789abcdef0123456789abcdef01234567.torrent',
+    ],
+)
+def test_infohash(download: str) -> None:
+    assert infohash(download) == '0123456789abcdef0123456789abcdef01234567'
+
+
+@mark.parametrize('fold', [False, True])
+def test_deduplicator(fold: bool) -> None:
+    hash = '0123456789abcdef0123456789abcdef01234567'
+    first, second, third = (
+        ITorrentFactory.build(source=source, seeders=seeders, download=download)
+        for source, seeders, download in [
+            (ProviderSource.TORRENTS_CSV, 5, f'magnet:?xt=urn:btih:{hash}'),
+            (ProviderSource.PIRATEBAY, 10, f'magnet:?xt=urn:btih:{hash.upper()}&dn=a'),
+            (ProviderSource.NYAA_SI, 1, 'https://example.com/other.torrent'),
+        ]
+    )
+    dedupe = Deduplicator(fold=fold)
+
+    kept = dedupe.add(first)
+    assert kept == first
+    assert dedupe.add(second) is None
+    assert dedupe.add(third) == third
+
+    assert kept
+    if fold:
+        assert kept.seeders == 10
+        assert kept.also_from == [ProviderSource.PIRATEBAY]
+    else:
+        # already sent on, so left as it was
+        assert kept.seeders == 5
+        assert kept.also_from == []
+    # the original (which may be cached) is left alone
+    assert first.seeders == 5
+    assert first.also_from == []
+
+
+@mark.asyncio
+async def test_circuit_breaker(fake_provider: MakeProvider) -> None:
+    provider = fake_provider(error=ConnectionError(), failure_threshold=2)
+
+    async def worker(put: Put, provider: TvProvider) -> None:
+        async for result in search_tv(provider, ImdbId('tt0000001'), TmdbId(1), 1):
+            await put(result)
+
+    async def events() -> list[str]:
+        items = await tolist(spin_up_workers(worker, [provider]))
+        return [item.event for item in items if isinstance(item, Message)]
+
+    assert await events() == ['err']
+    assert await events() == ['err']
+    assert breakers[provider.type].state is BreakerState.OPEN
+
+    assert await events() == ['unavailable', 'exit']
+    assert provider.calls == 2
+
+
+@mark.asyncio
+async def test_provider_registry(monkeypatch: MonkeyPatch) -> None:
+    started: list[ProviderSource] = []
+    stopped: list[ProviderSource] = []
+
+    async def startup(self: Provider) -> None:
+        started.append(self.type)
+
+    async def shutdown(self: Provider) -> None:
+        stopped.append(self.type)
+
+    monkeypatch.setattr(Provider, 'startup', startup)
+    monkeypatch.setattr(Provider, 'shutdown', shutdown)
+    settings = Settings(
+        plex_token=SecretStr('plex_token'),
+        statsig_key=SecretStr('statsig_key'),
+        providers=['piratebay', 'nyaasi'],
+        provider_concurrency={'nyaasi': 1},
+    )
+
+    async with provider_registry(settings) as providers:
+        assert get_providers() is providers
+        assert started == [ProviderSource.PIRATEBAY, ProviderSource.NYAA_SI]
+        assert [provider.concurrency for provider in providers] == [4, 1]
+        assert not stopped
+
+    assert get_providers() is not providers
+    assert stopped == started
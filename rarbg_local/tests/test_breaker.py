@@ -0,0 +1,46 @@
+from freezegun import freeze_time
+from pytest import raises
+
+from ..breaker import BreakerState, CircuitBreaker, CircuitOpen
+
+
+def test_circuit_breaker() -> None:
+    with freeze_time('2020-01-01 00:00:00') as frozen:
+        breaker = CircuitBreaker(threshold=2, cooldown=60)
+
+        breaker.failure()
+        assert breaker.info()['state'] == BreakerState.CLOSED.value
+        breaker.failure()
+        assert breaker.info()['state'] == BreakerState.OPEN.value
+
+        with raises(CircuitOpen):
+            breaker.check()
+        assert breaker.info()['skipped'] == 1
+
+        frozen.tick(60)
+        assert breaker.info()['state'] == BreakerState.HALF_OPEN.value
+        assert breaker.check()
+        # only the one probe at a time
+        with raises(CircuitOpen):
+            breaker.check()
+        assert breaker.info()['skipped'] == 2
+
+        # an abandoned probe lets another call probe
+        breaker.release()
+        assert breaker.check()
+
+        # a failed probe opens it straight away
+        breaker.failure()
+        assert breaker.info()['state'] == BreakerState.OPEN.value
+        assert breaker.trips == 2
+
+        frozen.tick(60)
+        breaker.success()
+        assert breaker.info()['state'] == BreakerState.CLOSED.value
+        assert breaker.info() == {
+            'state': 'closed',
+            'failures': 0,
+            'trips': 2,
+            'skipped': 2,
+            'retry_in': None,
+        }
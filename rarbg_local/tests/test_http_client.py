@@ -0,0 +1,37 @@
+import asyncio
+
+from aiohttp import ClientSession
+from pytest import mark
+
+from ..http_client import ClientRegistry
+
+
+@mark.asyncio
+async def test_session_per_host() -> None:
+    registry = ClientRegistry()
+
+    tmdb = registry.get('https://api.themoviedb.org/3/')
+    assert registry.get('https://api.themoviedb.org/3/movie/1') is tmdb
+    assert registry.get('https://apibay.org/q.php') is not tmdb
+
+    await registry.close()
+    assert tmdb.closed
+    assert registry.get('https://api.themoviedb.org/3/') is not tmdb
+    await registry.close()
+
+
+def test_sessions_from_old_loops_are_closed() -> None:
+    registry = ClientRegistry()
+
+    async def get() -> ClientSession:
+        return registry.get('https://api.themoviedb.org/3/')
+
+    first = asyncio.run(get())
+    second = asyncio.run(get())
+    assert second is not first
+    assert registry.stale == [first]
+
+    asyncio.run(registry.close())
+    assert first.closed
+    assert second.closed
+    assert registry.stale == []
@@ -1,3 +1,4 @@
+import asyncio
 import json
 import logging
 from collections.abc import Generator
@@ -6,13 +7,14 @@ from typing import TYPE_CHECKING, Any, Never
 from unittest.mock import MagicMock, patch
 from urllib.parse import urlencode
 
+from aiocache import Cache
 from aioresponses import aioresponses as Aioresponses
 from async_asgi_testclient import TestClient
 from fastapi import FastAPI
 from lxml.builder import E
 from lxml.etree import tostring
 from psycopg import OperationalError
-from pydantic import BaseModel, SecretStr
+from pydantic import BaseModel, SecretStr, TypeAdapter
 from pytest import LogCaptureFixture, MonkeyPatch, fixture, mark, raises
 from pytest_snapshot.plugin import Snapshot
 from responses import RequestsMock
@@ -22,19 +24,25 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import joinedload
 
+from .. import search_index
 from ..auth import get_current_user
+from ..breaker import CircuitBreaker
+from ..cache import CompactSerializer
 from ..db import MAX_TRIES, Download, User, create_episode, create_movie
 from ..health import DiagnosticsRoot
 from ..main import get_episodes
-from ..models import ITorrent
+from ..models import ITorrent, ProviderSource
 from ..new import SearchResponse, Settings, get_settings
+from ..providers import breakers, results_key
 from ..providers.piratebay import PirateBayProvider
 from ..tmdb import MovieExternalIds, TvExternalIds
 from ..types import ImdbId, TmdbId
+from ..utils import set_shared_cache
 from .conftest import add_json, assert_match_json, themoviedb, tolist
 from .factories import (
     DownloadPostFactory,
     EpisodeDetailsFactory,
+    ITorrentFactory,
     MovieDetailsFactory,
     MovieResponseFactory,
     TvApiResponseFactory,
@@ -485,6 +493,41 @@ async def test_search(
     assert_match_json(snapshot, res, 'search.json')
 
 
+@mark.asyncio
+async def test_search_local(
+    aioresponses: Aioresponses, test_client: TestClient
+) -> None:
+    ids = {'Chernobyl': 1, 'Chernobyl Diaries': 2, 'The Diaries': 3}
+
+    def search(query: str, *titles: str) -> None:
+        results = [
+            {'id': ids[title], 'media_type': 'movie', 'title': title}
+            for title in titles
+        ]
+        themoviedb(
+            aioresponses, '/search/multi', {'results': results}, f'query={query}'
+        )
+
+    search('chernobyl', 'Chernobyl', 'Chernobyl Diaries')
+    res = await test_client.get('/api/search?query=chernobyl')
+    assert res.status_code == 200
+
+    search('chernobly')
+    res = await test_client.get('/api/search?query=chernobly&mode=local')
+    assert [result['title'] for result in res.json()] == [
+        'Chernobyl',
+        'Chernobyl Diaries',
+    ]
+    await asyncio.gather(*search_index._pending)
+
+    search('diaries', 'Chernobyl Diaries', 'The Diaries')
+    res = await test_client.get('/api/search?query=diaries&mode=merged')
+    assert [result['title'] for result in res.json()] == [
+        'Chernobyl Diaries',
+        'The Diaries',
+    ]
+
+
 @mark.asyncio
 async def test_delete_cascade(
     test_client: TestClient, async_session: AsyncSession
@@ -537,9 +580,10 @@ async def test_select_season(
             'number_of_seasons': 1,
             'seasons': [{'episode_count': 1, 'season_number': 1}],
             'name': 'hello',
+            'external_ids': {'id': tmdb_id, 'imdb_id': 'tt00000'},
         },
+        urlencode({'append_to_response': 'external_ids'}),
     )
-    stub_tv_external_ids(aioresponses, tmdb_id=tmdb_id)
 
     res = await test_client.get(f'/api/tv/{tmdb_id}')
 
@@ -547,6 +591,44 @@ async def test_select_season(
 
     assert_match_json(snapshot, res, f'tv_{tmdb_id}.json')
 
+    # shared with the batch lookup
+    res = await test_client.post(
+        '/api/tmdb/batch', json=[{'type': 'series', 'tmdb_id': tmdb_id}]
+    )
+    assert res.json()[0]['title'] == 'hello'
+
+    # only the show and its external ids are fetched up front, rather than
+    # every season the show might have
+    (request,) = aioresponses.requests.values()
+    assert len(request) == 1
+
+
+@mark.asyncio
+async def test_tv_prefetch_failure(
+    aioresponses: Aioresponses, test_client: TestClient
+) -> None:
+    tmdb_id = TmdbId(100000)
+    aioresponses.get(
+        f'https://api.themoviedb.org/3/tv/{tmdb_id}?'
+        + urlencode({'append_to_response': 'external_ids'}),
+        status=500,
+    )
+    themoviedb(
+        aioresponses,
+        f'/tv/{tmdb_id}',
+        {'number_of_seasons': 1, 'seasons': [], 'name': 'hello'},
+    )
+    themoviedb(
+        aioresponses,
+        f'/tv/{tmdb_id}/external_ids',
+        {'id': tmdb_id, 'imdb_id': 'tt00000'},
+    )
+
+    res = await test_client.get(f'/api/tv/{tmdb_id}')
+
+    assert res.status_code == 200
+    assert (res.json()['title'], res.json()['imdb_id']) == ('hello', 'tt00000')
+
 
 @mark.asyncio
 async def test_foreign_key_integrity(async_session: AsyncSession) -> None:
@@ -635,6 +717,39 @@ async def test_movie(
     assert_match_json(snapshot, r, 'movie_1.json')
 
 
+@mark.asyncio
+async def test_tmdb_batch(test_client: TestClient, aioresponses: Aioresponses) -> None:
+    themoviedb(aioresponses, '/movie/1', {'title': 'Hello', 'imdb_id': 'tt0000000'})
+    themoviedb(
+        aioresponses,
+        '/tv/2',
+        {
+            'number_of_seasons': 1,
+            'seasons': [],
+            'name': 'World',
+            'external_ids': {'id': 2, 'imdb_id': 'tt0000002'},
+        },
+        urlencode({'append_to_response': 'external_ids'}),
+    )
+    aioresponses.get('https://api.themoviedb.org/3/movie/3', status=404)
+
+    r = await test_client.post(
+        '/api/tmdb/batch',
+        json=[
+            {'type': 'movie', 'tmdb_id': 1},
+            {'type': 'series', 'tmdb_id': 2},
+            {'type': 'movie', 'tmdb_id': 3},
+        ],
+    )
+    assert r.status_code == 200
+
+    movie, tv, missing = r.json()
+    assert (movie['title'], movie['imdb_id']) == ('Hello', 'tt0000000')
+    assert (tv['title'], tv['imdb_id']) == ('World', 'tt0000002')
+    assert missing['tmdb_id'] == 3
+    assert missing['error'].startswith('404')
+
+
 @mark.asyncio
 async def test_openapi(test_client: TestClient, snapshot: Snapshot) -> None:
     r = await test_client.get('/openapi.json')
@@ -747,6 +862,34 @@ async def test_stream(
     )
 
 
+@mark.asyncio
+async def test_stream_breaker_open(
+    test_client: TestClient, aioresponses: Aioresponses
+) -> None:
+    stub_tv_external_ids(aioresponses, tmdb_id=TmdbId(1))
+    breaker = breakers[ProviderSource.PIRATEBAY] = CircuitBreaker(threshold=1)
+    breaker.failure()
+    shared = Cache(Cache.MEMORY, serializer=CompactSerializer())
+    set_shared_cache(shared)
+    try:
+        url = '/api/stream/series/1?season=1&episode=1&source=piratebay'
+        r = await test_client.get(url)
+        assert r.status_code == 503
+
+        # cached results are still served
+        torrent = ITorrentFactory.build(source=ProviderSource.PIRATEBAY)
+        await shared.set(
+            results_key(PirateBayProvider(), ImdbId('tt00000'), 1, 1),
+            TypeAdapter(list[ITorrent]).dump_json([torrent]),
+        )
+        r = await test_client.get(url)
+        assert r.status_code == 200
+        assert r.text == f'data: {torrent.model_dump_json()}\n\ndata:\n\n'
+    finally:
+        set_shared_cache(None)
+        await shared.close()
+
+
 @mark.asyncio
 async def test_schema(snapshot: Snapshot) -> None:
     assert_match_json(snapshot, SearchResponse.model_json_schema(), 'schema.json')
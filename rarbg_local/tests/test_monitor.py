@@ -99,8 +99,13 @@ async def test_update_monitor(
     ).raise_for_status()
 
     async def impl(
-        tmdb_id: TmdbId, type: MediaType, season: int, episode: int | None = None
+        tmdb_id: TmdbId,
+        type: MediaType,
+        season: int,
+        episode: int | None = None,
+        limit: int | None = None,
     ) -> AsyncGenerator[ITorrent, None]:
+        assert limit == 1
         if tmdb_id == 5:
             yield ITorrentFactory.build(source=ProviderSource.TORRENTS_CSV)
         else:
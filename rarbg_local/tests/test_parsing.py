@@ -0,0 +1,106 @@
+import asyncio
+from concurrent.futures import (
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any
+
+from pydantic import SecretStr
+from pytest import MonkeyPatch, mark, raises
+
+from .. import parsing
+from ..parsing import make_executor, parse_executor, run_parser
+from ..providers.horriblesubs import parse_downloads
+from ..settings import Settings
+
+results = (
+    Path(__file__).parent
+    / 'testresources/providers/test_horriblesubs/test_get_downloads/results.html'
+).read_text()
+
+
+@mark.asyncio
+@mark.parametrize(
+    'processes,executor', [(1, ProcessPoolExecutor), (0, ThreadPoolExecutor)]
+)
+async def test_run_parser(processes: int, executor: type) -> None:
+    settings = Settings(
+        plex_token=SecretStr('plex_token'),
+        statsig_key=SecretStr('statsig_key'),
+        parse_processes=processes,
+    )
+
+    async with parse_executor(settings) as pool:
+        assert isinstance(pool, executor)
+        parsed = await run_parser(parse_downloads, results)
+
+    assert parsed
+    assert parsed == parse_downloads(results)
+
+
+def broken_submit(*args: Any, **kwargs: Any) -> Future:
+    # as when a worker has died
+    future = Future[Any]()
+    future.set_exception(BrokenProcessPool())
+    return future
+
+
+def failing_submit(*args: Any, **kwargs: Any) -> Future:
+    # as when processes can't be started
+    raise OSError()
+
+
+@mark.asyncio
+@mark.parametrize('submit', [broken_submit, failing_submit])
+async def test_run_parser_falls_back_to_threads(
+    submit: Any, monkeypatch: MonkeyPatch
+) -> None:
+    settings = Settings(
+        plex_token=SecretStr('plex_token'),
+        statsig_key=SecretStr('statsig_key'),
+        parse_processes=1,
+    )
+
+    made: list[Executor] = []
+
+    def recording(processes: int) -> Executor:
+        made.append(executor := make_executor(processes))
+        return executor
+
+    monkeypatch.setattr(parsing, 'make_executor', recording)
+
+    async with parse_executor(settings) as pool:
+        monkeypatch.setattr(pool, 'submit', submit)
+        parsed = await asyncio.gather(
+            run_parser(parse_downloads, results), run_parser(parse_downloads, results)
+        )
+
+    expected = parse_downloads(results)
+    assert list(parsed) == [expected, expected]
+    # swapped once, and the replacement shut down along with the app
+    _, threads = made
+    assert isinstance(threads, ThreadPoolExecutor)
+    assert threads._shutdown
+
+
+def unreadable(text: str) -> None:
+    raise OSError('unreadable')
+
+
+@mark.asyncio
+async def test_run_parser_errors() -> None:
+    settings = Settings(
+        plex_token=SecretStr('plex_token'),
+        statsig_key=SecretStr('statsig_key'),
+        parse_processes=1,
+    )
+
+    async with parse_executor(settings) as pool:
+        # the parser's own errors are passed on, rather than retried in threads
+        with raises(OSError, match='unreadable'):
+            await run_parser(unreadable, results)
+        assert parsing._executor is pool
@@ -0,0 +1,61 @@
+from collections.abc import AsyncGenerator
+
+from pytest import mark
+
+from ..models import ITorrent, RankedUpdate
+from ..ranking import TopK, top_k
+from .conftest import tolist
+from .factories import ITorrentFactory
+
+
+def test_top_k() -> None:
+    first, second, third, fourth = (
+        ITorrentFactory.build(seeders=seeders) for seeders in [5, 10, 1, 5]
+    )
+    top = TopK(2)
+
+    assert top.add(first) == RankedUpdate(inserted=first)
+    assert top.add(second) == RankedUpdate(inserted=second)
+    assert top.add(third) is None
+    # ties go to whichever arrived first
+    assert top.add(fourth) is None
+    assert top.ranked() == [second, first]
+
+
+def test_top_k_rank_by() -> None:
+    unmarked, episode, pack, hd = (
+        ITorrentFactory.build(title=title, seeders=seeders)
+        for title, seeders in [
+            ('Show.Special.720p', 1000),
+            ('Show.S01E01.720p', 100),
+            ('Show.S01.720p', 10),
+            ('Show.S01E01.1080p', 1),
+        ]
+    )
+
+    packs = TopK(1, 'pack')
+    packs.add(episode)
+    # without a season, it's not a pack either
+    assert packs.add(unmarked) == RankedUpdate(inserted=unmarked, evicted=episode)
+    assert packs.add(pack) == RankedUpdate(inserted=pack, evicted=unmarked)
+    assert packs.add(hd) is None
+
+    resolutions = TopK(1, 'resolution')
+    for torrent in (episode, pack, hd):
+        resolutions.add(torrent)
+    assert resolutions.ranked() == [hd]
+
+
+@mark.asyncio
+async def test_top_k_stream() -> None:
+    torrents = [ITorrentFactory.build(seeders=seeders) for seeders in [1, 2, 3]]
+
+    async def results() -> AsyncGenerator[ITorrent]:
+        for torrent in torrents:
+            yield torrent
+
+    assert await tolist(top_k(results(), 1)) == [
+        RankedUpdate(inserted=torrents[0]),
+        RankedUpdate(inserted=torrents[1], evicted=torrents[0]),
+        RankedUpdate(inserted=torrents[2], evicted=torrents[1]),
+    ]
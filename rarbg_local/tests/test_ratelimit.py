@@ -0,0 +1,41 @@
+import asyncio
+
+from pytest import mark
+
+from ..ratelimit import Priority, RateLimiter, background
+
+
+@mark.asyncio
+async def test_interactive_before_background() -> None:
+    limiter = RateLimiter(rate=100, burst=1)
+    order: list[str] = []
+
+    async def call(name: str) -> None:
+        await limiter.acquire()
+        order.append(name)
+
+    await limiter.acquire()  # use up the burst
+
+    with background():
+        cron = asyncio.create_task(call('cron'))
+    await asyncio.sleep(0)
+    search = asyncio.create_task(call('search'))
+
+    await asyncio.gather(cron, search)
+
+    assert order == ['search', 'cron']
+    assert limiter.stats[Priority.BACKGROUND].count == 1
+    assert limiter.stats[Priority.INTERACTIVE].count == 2
+
+
+@mark.asyncio
+async def test_pause() -> None:
+    limiter = RateLimiter(rate=1000)
+    limiter.pause(0.05)
+
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    await limiter.acquire()
+
+    assert loop.time() - start >= 0.04
+    assert limiter.stats[Priority.INTERACTIVE].max_wait >= 0.04
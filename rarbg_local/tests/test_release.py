@@ -0,0 +1,70 @@
+from pydantic import ValidationError
+from pytest import mark, raises
+
+from ..release import Release, parse_release
+
+
+@mark.parametrize(
+    'title,expected',
+    [
+        (
+            'Chernobyl.S01E01.1.23.45.1080p.AMZN.WEBRip.DDP5.1.x264-NTb[rartv]',
+            Release(
+                season=1,
+                episode=1,
+                marker='S01E01',
+                resolution=1080,
+                codec='x264',
+                source='webrip',
+                group='NTb',
+            ),
+        ),
+        (
+            'Show.s02e03-e05.720p.HDTV.H.265-GRP',
+            Release(
+                season=2,
+                episode=3,
+                last_episode=5,
+                marker='s02e03',
+                resolution=720,
+                codec='h265',
+                source='hdtv',
+                group='GRP',
+            ),
+        ),
+        ('Show S01 Complete 720p', Release(season=1, resolution=720)),
+        # not a marker, as it's part of a word
+        (
+            'Yes01.Show.S02E03.720p',
+            Release(season=2, episode=3, marker='S02E03', resolution=720),
+        ),
+        # underscores and version suffixes don't hide the marker
+        (
+            '[Grp]_Show_S01E01_[1080p]',
+            Release(season=1, episode=1, marker='S01E01', resolution=1080),
+        ),
+        (
+            'Show.S01E01v2.1080p',
+            Release(season=1, episode=1, marker='S01E01', resolution=1080),
+        ),
+        # an episode marker wins over a bare season before it
+        ('Show.S01.Extras.S01E05', Release(season=1, episode=5, marker='S01E05')),
+        ('Movie.2019.4K.HDR.BluRay', Release(resolution=2160, source='bluray')),
+        ('Something else', Release()),
+    ],
+)
+def test_parse_release(title: str, expected: Release) -> None:
+    assert parse_release(title) == expected
+
+
+def test_frozen() -> None:
+    release = parse_release('Show S01E01 1080p')
+    with raises(ValidationError):
+        release.season = 2  # type: ignore[misc]
+    assert parse_release('Show S01E01 1080p').season == 1
+
+
+def test_pack() -> None:
+    assert parse_release('Show S01 1080p').pack
+    assert not parse_release('Show S01E01 1080p').pack
+    assert not parse_release('Movie 1080p').pack
@@ -0,0 +1,38 @@
+from ..models import MediaType, SearchResponse
+from ..search_index import TitleIndex
+
+
+def make(tmdb_id: int, title: str, year: int | None = None) -> SearchResponse:
+    return SearchResponse(type=MediaType.MOVIE, tmdb_id=tmdb_id, title=title, year=year)
+
+
+def test_search() -> None:
+    index = TitleIndex()
+    index.update(
+        [
+            make(1, 'The Office'),
+            make(2, 'Office Space'),
+            make(3, 'Breaking Bad'),
+            make(4, 'Better Call Saul'),
+        ]
+    )
+
+    def titles(query: str) -> list[str]:
+        return [result.title for result in index.search(query)]
+
+    # prefixes of any word, shortest titles first
+    assert titles('off') == ['The Office', 'Office Space']
+    assert titles('saul') == ['Better Call Saul']
+    # misspellings
+    assert titles('brekaing bad') == ['Breaking Bad']
+    assert titles('nothing like it') == []
+
+
+def test_add_keeps_year() -> None:
+    index = TitleIndex()
+    index.add(make(1, 'Dune', 2021))
+    index.add(make(1, 'Dune: Part One'))
+
+    assert index.search('dune part') == [make(1, 'Dune: Part One', 2021)]
+    assert index.search('dune') == index.search('dune part')
+    assert len(index) == 1
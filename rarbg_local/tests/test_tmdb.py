@@ -1,8 +1,22 @@
 from pathlib import Path
 
+from aioresponses import aioresponses as Aioresponses
+from fastapi import FastAPI
+from freezegun import freeze_time
+from pydantic import BaseModel
+from pytest import mark
 from pytest_snapshot.plugin import Snapshot
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..tmdb import SearchBaseResponse
+from ..db import TmdbResponse, get_async_sessionmaker
+from ..singleton import get
+from ..tmdb import (
+    RETRY_AFTER_DEFAULT,
+    SearchBaseResponse,
+    get_json,
+    persistent_store,
+    retry_after,
+)
 
 
 def test_load(snapshot: Snapshot, resource_path: Path) -> None:
@@ -12,3 +26,74 @@ def test_load(snapshot: Snapshot, resource_path: Path) -> None:
         ).model_dump_json(indent=2),
         'tmdb_search_base_response.json',
     )
+
+
+@mark.asyncio
+async def test_conditional_revalidation(
+    fastapi_app: FastAPI, async_session: AsyncSession, aioresponses: Aioresponses
+) -> None:
+    url = 'https://api.themoviedb.org/3/configuration'
+    body = {'images': {'base_url': 'http://image.tmdb.org/t/p/'}}
+    aioresponses.get(url, payload=body, headers={'ETag': '"v1"'})
+    aioresponses.get(url, status=304)
+
+    with persistent_store(await get(fastapi_app, get_async_sessionmaker)):
+        first = await get_json('configuration', Model)
+        second = await get_json('configuration', Model)
+
+    assert first == second
+    assert first.images == body['images']
+
+    (key,) = aioresponses.requests
+    assert 'If-None-Match' not in aioresponses.requests[key][0].kwargs['headers']
+    assert aioresponses.requests[key][1].kwargs['headers']['If-None-Match'] == '"v1"'
+
+    stored = await async_session.get(TmdbResponse, 'configuration')
+    assert stored
+    assert stored.etag == '"v1"'
+
+
+@mark.asyncio
+async def test_revalidation_stays_in_memory(
+    fastapi_app: FastAPI, async_session: AsyncSession, aioresponses: Aioresponses
+) -> None:
+    url = 'https://api.themoviedb.org/3/configuration'
+    body = {'images': {'base_url': 'http://image.tmdb.org/t/p/'}}
+    aioresponses.get(url, payload=body, headers={'ETag': '"v1"'})
+    aioresponses.get(url, status=304, repeat=True)
+
+    sessionmaker = await get(fastapi_app, get_async_sessionmaker)
+    sessions = 0
+
+    def counting() -> AsyncSession:
+        nonlocal sessions
+        sessions += 1
+        return sessionmaker()
+
+    with persistent_store(counting):  # type: ignore[arg-type]
+        for _ in range(3):
+            assert (await get_json('configuration', Model)).images == body['images']
+
+    # reading the key that isn't there yet, and then writing it
+    assert sessions == 2
+
+
+class Model(BaseModel):
+    images: dict[str, str]
+
+
+@freeze_time('2020-01-01 00:00:00')
+@mark.parametrize(
+    'value,expected',
+    [
+        ('5', 5),
+        ('Wed, 01 Jan 2020 00:00:10 GMT', 10),
+        # no timezone, taken to be UTC
+        ('Wed, 01 Jan 2020 00:00:10 -0000', 10),
+        ('Tue, 31 Dec 2019 23:59:00 GMT', 0),
+        ('soon', RETRY_AFTER_DEFAULT),
+        (None, RETRY_AFTER_DEFAULT),
+    ],
+)
+def test_retry_after(value: str | None, expected: float) -> None:
+    assert retry_after(value) == expected
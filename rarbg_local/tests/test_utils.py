@@ -1,8 +1,25 @@
 import asyncio
+from collections.abc import AsyncGenerator, Callable, Coroutine
+from typing import Any
 
+from aiocache import Cache
+from cachetools import LRUCache
+from fastapi import Request
+from pydantic import BaseModel
 from pytest import mark
 
-from ..utils import Message, create_monitored_task
+from ..cache import CompactSerializer
+from ..utils import (
+    Message,
+    cache_clear,
+    cache_info,
+    cached,
+    cancel_on,
+    create_monitored_task,
+    disconnected,
+    lru_cache,
+    set_shared_cache,
+)
 
 
 async def coro(queue: asyncio.Queue[int | Message]) -> None:
@@ -19,3 +36,174 @@ async def test_create_monitored_task() -> None:
     message = await output_queue.get()
     assert isinstance(message, Message)
     assert message.event == 'exit'
+
+
+@mark.asyncio
+async def test_cancel_on() -> None:
+    stop = asyncio.Event()
+    closed = False
+
+    async def results() -> AsyncGenerator[int]:
+        nonlocal closed
+        try:
+            yield 1
+            stop.set()
+            await asyncio.sleep(10)
+            yield 2
+        finally:
+            closed = True
+
+    assert [item async for item in cancel_on(stop.wait(), results())] == [1]
+    assert closed
+
+
+@mark.asyncio
+async def test_disconnected() -> None:
+    gone = asyncio.Event()
+
+    async def receive() -> dict[str, Any]:
+        await gone.wait()
+        return {'type': 'http.disconnect'}
+
+    waiting = asyncio.create_task(
+        disconnected(Request({'type': 'http'}, receive), interval=0.01)
+    )
+    await asyncio.sleep(0.05)
+    assert not waiting.done()
+
+    gone.set()
+    await asyncio.wait_for(waiting, 1)
+
+
+@mark.asyncio
+async def test_cached_coalesces_concurrent_misses() -> None:
+    calls = 0
+    release = asyncio.Event()
+
+    @cached(LRUCache(10))
+    async def fetch(key: int) -> int:
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return key * 2
+
+    pending = asyncio.gather(*(fetch(1) for _ in range(5)))
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await pending == [2] * 5
+    assert await fetch(1) == 2
+    assert calls == 1
+    assert getattr(fetch, 'cache_stats').coalesced == 4
+
+
+@mark.asyncio
+async def test_cached_does_not_cache_failures() -> None:
+    calls = 0
+
+    @cached(LRUCache(10))
+    async def fetch() -> int:
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            await asyncio.sleep(0)
+            raise ValueError('boom')
+        return calls
+
+    results = await asyncio.gather(fetch(), fetch(), return_exceptions=True)
+    assert [type(result) for result in results] == [ValueError, ValueError]
+
+    assert await fetch() == 2
+
+
+@mark.asyncio
+async def test_cached_stale_while_revalidate() -> None:
+    calls = 0
+
+    @cached(LRUCache(10), stale_after=0)
+    async def fetch() -> int:
+        nonlocal calls
+        calls += 1
+        if calls == 3:
+            raise ValueError('rate limited')
+        return calls
+
+    assert await fetch() == 1
+    # stale, so the old value is served while it refreshes
+    assert await fetch() == 1
+    await asyncio.sleep(0.01)
+    assert await fetch() == 2
+
+    # refresh fails, stale value is kept
+    await asyncio.sleep(0.01)
+    assert await fetch() == 2
+    await asyncio.sleep(0.01)
+    assert await fetch() == 4
+
+    stats = getattr(fetch, 'cache_stats')
+    assert stats.refreshes == 4
+    assert stats.refresh_failures == 1
+
+
+class Show(BaseModel):
+    name: str
+
+
+@mark.asyncio
+async def test_cached_shared_between_workers() -> None:
+    calls = 0
+
+    def worker() -> Callable[[int], Coroutine[Any, Any, Show]]:
+        @cached(LRUCache(10), shared_ttl=60)
+        async def get_show(id: int) -> Show:
+            nonlocal calls
+            calls += 1
+            return Show(name=f'Show {id}')
+
+        return get_show
+
+    shared = Cache(Cache.MEMORY, serializer=CompactSerializer())
+    set_shared_cache(shared)
+    try:
+        first, second = worker(), worker()
+
+        assert await first(1) == Show(name='Show 1')
+        assert await second(1) == Show(name='Show 1')
+        assert calls == 1
+        assert getattr(second, 'cache_stats').shared_hits == 1
+    finally:
+        set_shared_cache(None)
+        await shared.close()
+
+
+@mark.asyncio
+async def test_cached_records_stats() -> None:
+    @cached(LRUCache(2))
+    async def fetch(key: int) -> int:
+        return key
+
+    for key in (1, 1, 2, 3):
+        await fetch(key)
+
+    stats = getattr(fetch, 'cache_stats')
+    assert (stats.hits, stats.misses, stats.evictions) == (1, 3, 1)
+    assert sum(stats.miss_latency) == 3
+
+    info = cache_info()[f'{__name__}.{fetch.__qualname__}']
+    assert info['size'] == info['maxsize'] == 2
+    assert info['bytes'] > 0
+
+
+def test_lru_cache_records_stats() -> None:
+    @lru_cache(1)
+    def double(key: int) -> int:
+        return key * 2
+
+    assert [double(1), double(1), double(2)] == [2, 2, 4]
+
+    stats = getattr(double, 'cache_stats')
+    assert (stats.hits, stats.misses, stats.evictions) == (1, 2, 1)
+
+    cache_clear()
+    assert stats.hits == 0
+    assert len(getattr(double, 'cache')) == 0
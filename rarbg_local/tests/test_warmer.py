@@ -0,0 +1,67 @@
+from urllib.parse import urlencode
+
+from aioresponses import aioresponses as Aioresponses
+from fastapi import FastAPI
+from pytest import MonkeyPatch, mark
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import warmer
+from ..db import get_async_sessionmaker
+from ..singleton import get
+from ..tmdb import get_tv_episodes
+from ..types import TmdbId
+from ..warmer import WarmerProgress, get_library, warm
+from .conftest import themoviedb
+from .factories import EpisodeDetailsFactory, MovieDetailsFactory
+
+
+@mark.asyncio
+async def test_warm(
+    fastapi_app: FastAPI,
+    async_session: AsyncSession,
+    aioresponses: Aioresponses,
+    monkeypatch: MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(warmer, 'progress', progress := WarmerProgress())
+    tmdb_id = TmdbId(100000)
+    async_session.add_all(
+        [
+            EpisodeDetailsFactory.create(
+                download__tmdb_id=tmdb_id, season=1, episode=None
+            ),
+            EpisodeDetailsFactory.create(
+                download__tmdb_id=tmdb_id, season=2, episode=None
+            ),
+            EpisodeDetailsFactory.create(download__tmdb_id=tmdb_id, season=3),
+            MovieDetailsFactory.create(download__tmdb_id=5),
+        ]
+    )
+    await async_session.commit()
+    sessionmaker = await get(fastapi_app, get_async_sessionmaker)
+
+    library = await get_library(sessionmaker)
+    assert library.shows == {tmdb_id: {1, 2}}
+    assert library.movies == {5}
+
+    themoviedb(
+        aioresponses,
+        f'/tv/{tmdb_id}',
+        {
+            'number_of_seasons': 3,
+            'seasons': [],
+            'name': 'hello',
+            'external_ids': {'id': tmdb_id, 'imdb_id': 'tt00000'},
+            'season/1': {'episodes': []},
+            'season/2': {'episodes': []},
+        },
+        urlencode({'append_to_response': 'external_ids,season/1,season/2'}),
+    )
+    themoviedb(aioresponses, '/movie/5', {'title': 'Movie', 'imdb_id': 'tt00001'})
+
+    await warm(sessionmaker)
+
+    assert (progress.total, progress.done, progress.failed) == (2, 2, 0)
+    assert progress.finished_at
+
+    # served from cache, as nothing else has been mocked
+    assert (await get_tv_episodes(tmdb_id, 2)).episodes == []
@@ -61,6 +61,8 @@ async def test_websocket(
     mock_current_user: None,
 ) -> None:
     class FakeProvider(MovieProvider):
+        type = ProviderSource.PIRATEBAY
+
         async def search_for_movie(
             self, imdb_id: ImdbId, tmdb_id: TmdbId
         ) -> AsyncGenerator[ITorrent, None]:
@@ -1,14 +1,25 @@
+import logging
 import os
-from datetime import date, datetime
+from collections.abc import Generator, Mapping
+from contextlib import contextmanager
+from datetime import UTC, date, datetime, timedelta
+from email.utils import parsedate_to_datetime
 from enum import Enum
+from http import HTTPStatus
 from typing import Annotated, Any, Literal
+from urllib.parse import urlencode
 
 import aiohttp
-import aiohttp.web_exceptions
 import backoff
 from cachetools import LRUCache, TTLCache
-from pydantic import BaseModel, Field, model_validator
-
+from multidict import CIMultiDictProxy
+from pydantic import BaseModel, ConfigDict, Field, model_validator
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from .config import tmdb_rate_limit
+from .db import TmdbResponse
+from .http_client import get_session
 from .models import (
     MediaType,
     MovieResponse,
@@ -16,19 +27,163 @@ from .models import (
     TvApiResponse,
     TvSeasonResponse,
 )
+from .ratelimit import RateLimiter
 from .types import ImdbId, TmdbId
-from .utils import cached
+from .utils import cached, non_null, prime
+
+logger = logging.getLogger(__name__)
 
 base = 'https://api.themoviedb.org/3/'
 
+# entries older than SOFT_TTL are refreshed in the background, and may be
+# served for up to HARD_TTL while TMDB is unavailable. entries shared between
+# workers live for SOFT_TTL, or HARD_TTL when they are not expected to change
+SOFT_TTL = 360
+HARD_TTL = 6 * 60 * 60
+
+# seconds to back off for when TMDB rate limits us without saying how long for
+RETRY_AFTER_DEFAULT = 1.0
+
+# how stale a stored response's fetched_at may get before a revalidation
+# touches it, so that most revalidations don't write to the store
+TOUCH_INTERVAL = timedelta(seconds=HARD_TTL)
+
+# the maximum number of items TMDB will append to a single response
+APPEND_TO_RESPONSE_LIMIT = 20
+
 ThingType = Literal['movie', 'tv']
 
 
+limiter = RateLimiter(tmdb_rate_limit)
+
+_store: async_sessionmaker | None = None
+# responses already validated from the store, keyed by the store key, along
+# with the validator they were stored under
+_validated: LRUCache[str, tuple[str, BaseModel]] = LRUCache(512)
+# rows already read from the store, or None when there wasn't one, so each
+# key is only read once
+_loaded: LRUCache[str, TmdbResponse | None] = LRUCache(512)
+
+
+@contextmanager
+def persistent_store(sessionmaker: async_sessionmaker) -> Generator[None]:
+    """
+    Persists TMDB responses to the `tmdb_response` table, so that they can be
+    revalidated with conditional requests rather than downloaded again.
+    """
+    global _store
+    _store = sessionmaker
+    try:
+        yield
+    finally:
+        _store = None
+        _validated.clear()
+        _loaded.clear()
+
+
+def store_key(path: str, params: Mapping[str, Any] | None) -> str:
+    return path + ('?' + urlencode(sorted(params.items())) if params else '')
+
+
+async def load_stored(key: str) -> TmdbResponse | None:
+    if _store is None:
+        return None
+    if key in _loaded:
+        return _loaded[key]
+    try:
+        async with _store() as session:
+            stored = _loaded[key] = await session.get(TmdbResponse, key)
+    except Exception:
+        logger.warning('Unable to read %s from store', key, exc_info=True)
+        return None
+    return stored
+
+
+async def save_stored(
+    key: str, headers: CIMultiDictProxy[str], body: bytes, value: BaseModel
+) -> None:
+    etag = headers.get('ETag')
+    last_modified = headers.get('Last-Modified')
+    if _store is None or not (etag or last_modified):
+        return
+    _validated[key] = (non_null(etag or last_modified), value)
+    stored = _loaded[key] = TmdbResponse(
+        key=key,
+        etag=etag,
+        last_modified=last_modified,
+        fetched_at=datetime.now(UTC),
+        body=body,
+    )
+    try:
+        async with _store() as session:
+            await session.merge(stored)
+            await session.commit()
+    except Exception:
+        logger.warning('Unable to write %s to store', key, exc_info=True)
+
+
+async def revalidated[TBaseModel: BaseModel](
+    stored: TmdbResponse, hydrate: type[TBaseModel]
+) -> TBaseModel:
+    assert _store
+    now = datetime.now(UTC)
+    fetched_at = stored.fetched_at
+    if fetched_at.tzinfo is None:
+        # sqlite doesn't keep the timezone
+        fetched_at = fetched_at.replace(tzinfo=UTC)
+    if now - fetched_at >= TOUCH_INTERVAL:
+        stored.fetched_at = now
+        try:
+            async with _store() as session:
+                await session.execute(
+                    update(TmdbResponse)
+                    .filter_by(key=stored.key)
+                    .values(fetched_at=now)
+                )
+                await session.commit()
+        except Exception:
+            logger.warning('Unable to update %s in store', stored.key, exc_info=True)
+
+    validator = non_null(stored.etag or stored.last_modified)
+    previous, value = _validated.get(stored.key, (None, None))
+    if previous == validator and isinstance(value, hydrate):
+        return value
+    value = hydrate.model_validate_json(stored.body)
+    _validated[stored.key] = (validator, value)
+    return value
+
+
+def retry_after(value: str | None) -> float:
+    '''
+    Seconds to wait, from a Retry-After header of either seconds or an HTTP
+    date, falling back to RETRY_AFTER_DEFAULT when it's missing or malformed
+    '''
+    if not value:
+        return RETRY_AFTER_DEFAULT
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError) as e:
+        logger.warning('Unable to parse Retry-After %r: %s', value, e)
+        return RETRY_AFTER_DEFAULT
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=UTC)
+    return max(0.0, (when - datetime.now(UTC)).total_seconds())
+
+
 @backoff.on_exception(
     backoff.fibo,
-    aiohttp.web_exceptions.HTTPException,
+    aiohttp.ClientResponseError,
     max_tries=5,
-    giveup=lambda e: not isinstance(e, aiohttp.web_exceptions.HTTPTooManyRequests),
+    giveup=lambda e: (
+        not (
+            isinstance(e, aiohttp.ClientResponseError)
+            and e.status == HTTPStatus.TOO_MANY_REQUESTS
+        )
+    ),
 )
 async def get_json[TBaseModel: BaseModel](
     path: str, hydrate: type[TBaseModel], **kwargs: Any
@@ -38,15 +193,31 @@ async def get_json[TBaseModel: BaseModel](
         if 'PYTEST_CURRENT_TEST' in os.environ
         else os.environ['TMDB_READ_ACCESS_TOKEN']
     )
-    async with aiohttp.ClientSession(
-        base_url=base,
-        headers={
-            'Authorization': f'Bearer {access_token}',
-        },
-    ) as tmdb:
-        r = await tmdb.get(path, **kwargs)
+    headers = {
+        'Authorization': f'Bearer {access_token}',
+    }
+
+    key = store_key(path, kwargs.get('params'))
+    stored = await load_stored(key)
+    if stored:
+        if stored.etag:
+            headers['If-None-Match'] = stored.etag
+        if stored.last_modified:
+            headers['If-Modified-Since'] = stored.last_modified
+
+    await limiter.acquire()
+    async with get_session(base).get(base + path, headers=headers, **kwargs) as r:
+        if r.status == HTTPStatus.TOO_MANY_REQUESTS:
+            # hold back every caller, not just this one
+            limiter.pause(retry_after(r.headers.get('Retry-After')))
+        if stored and r.status == HTTPStatus.NOT_MODIFIED:
+            return await revalidated(stored, hydrate)
         r.raise_for_status()
-        return hydrate.model_validate(await r.json())
+        body = await r.read()
+
+    value = hydrate.model_validate_json(body)
+    await save_stored(key, r.headers, body, value)
+    return value
 
 
 class EmptyStringAsNoneModel(BaseModel):
@@ -103,7 +274,7 @@ def get_title(result: SearchItem) -> str:
     )
 
 
-@cached(TTLCache(1024, 360))
+@cached(TTLCache(1024, HARD_TTL), stale_after=SOFT_TTL, shared_ttl=SOFT_TTL)
 async def search_themoviedb(s: str) -> list[SearchResponse]:
     MAP = {'tv': MediaType.SERIES, 'movie': MediaType.MOVIE}
     r = await get_json('search/multi', SearchBaseResponse, params={'query': s})
@@ -121,12 +292,12 @@ async def search_themoviedb(s: str) -> list[SearchResponse]:
     ]
 
 
-@cached(LRUCache(256))
+@cached(LRUCache(256), shared_ttl=HARD_TTL)
 async def get_movie(id: TmdbId) -> MovieResponse:
     return await get_json(f'movie/{id}', MovieResponse)
 
 
-@cached(TTLCache(256, 360))
+@cached(TTLCache(256, HARD_TTL), stale_after=SOFT_TTL, shared_ttl=SOFT_TTL)
 async def get_tv(id: TmdbId) -> TvApiResponse:
     return await get_json(f'tv/{id}', TvApiResponse)
 
@@ -155,7 +326,7 @@ class MovieExternalIds(ExternalIds):
     pass
 
 
-@cached(LRUCache(360))
+@cached(LRUCache(360), shared_ttl=HARD_TTL)
 async def get_external_ids(
     type: ThingType, id: TmdbId
 ) -> MovieExternalIds | TvExternalIds:
@@ -165,7 +336,7 @@ async def get_external_ids(
     )
 
 
-@cached(LRUCache(360))
+@cached(LRUCache(360), shared_ttl=HARD_TTL)
 async def get_tv_episode_imdb_id(
     tmdb_id: TmdbId, season: int, episode: int
 ) -> ImdbId | None:
@@ -181,11 +352,48 @@ async def get_imdb_id(type: ThingType, id: TmdbId) -> ImdbId:
     return (await get_external_ids(type, id)).imdb_id
 
 
-@cached(TTLCache(256, 360))
+@cached(TTLCache(256, HARD_TTL), stale_after=SOFT_TTL, shared_ttl=SOFT_TTL)
 async def get_tv_episodes(id: TmdbId, season: int) -> TvSeasonResponse:
     return await get_json(f'tv/{id}/season/{season}', TvSeasonResponse)
 
 
+class TvDetailsResponse(TvApiResponse):
+    model_config = ConfigDict(extra='allow')
+
+    external_ids: TvExternalIds
+
+    def appended_seasons(self) -> dict[int, TvSeasonResponse]:
+        return {
+            int(key.removeprefix('season/')): TvSeasonResponse.model_validate(value)
+            for key, value in (self.model_extra or {}).items()
+            if key.startswith('season/')
+        }
+
+
+@cached(TTLCache(256, HARD_TTL), stale_after=SOFT_TTL)
+async def prefetch_tv(id: TmdbId, seasons: tuple[int, ...] = ()) -> None:
+    """
+    Fetches a show along with its external ids and the given seasons in a
+    single request, priming the caches of `get_tv`, `get_external_ids` and
+    `get_tv_episodes`.
+
+    Seasons past what TMDB allows in one request are left for
+    `get_tv_episodes` to fetch.
+    """
+    append = ['external_ids', *(f'season/{season}' for season in seasons)]
+
+    r = await get_json(
+        f'tv/{id}',
+        TvDetailsResponse,
+        params={'append_to_response': ','.join(append[:APPEND_TO_RESPONSE_LIMIT])},
+    )
+
+    prime(get_tv, TvApiResponse.model_validate(r.model_dump()), id)
+    prime(get_external_ids, r.external_ids, 'tv', id)
+    for season, episodes in r.appended_seasons().items():
+        prime(get_tv_episodes, episodes, id, season)
+
+
 class ReleaseType(Enum):
     PREMIERE = 1
     THEATRICAL_LIMITED = 2
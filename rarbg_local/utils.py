@@ -1,59 +1,364 @@
 import asyncio
-from collections.abc import Callable, Coroutine, MutableMapping
-from dataclasses import dataclass
-from functools import partial
-from typing import Any, Protocol, cast, runtime_checkable
+import logging
+import math
+import pickle
+import sys
+import time
+from bisect import bisect_left
+from collections.abc import (
+    AsyncGenerator,
+    Awaitable,
+    Callable,
+    Coroutine,
+    Hashable,
+    MutableMapping,
+)
+from contextlib import aclosing, suppress
+from dataclasses import asdict, dataclass, field
+from functools import cache as cache_function
+from functools import partial, wraps
+from threading import RLock
+from typing import Any, NamedTuple, get_type_hints
+
+from aiocache.base import BaseCache
+from cachetools import Cache, LRUCache, TTLCache
+from cachetools.keys import hashkey
+from fastapi import Request
+from pydantic import TypeAdapter
+
+logger = logging.getLogger(__name__)
 
-from asyncache import cached as _cached
-from cachetools.func import lru_cache as _lru_cache
-from cachetools.func import ttl_cache as _ttl_cache
 
+type IdentityFunction[T] = Callable[[T], T]
 
-@runtime_checkable
-class Cache(Protocol):
-    def clear(self) -> None: ...
+# upper bounds, in seconds, of the buckets in the miss latency histograms
+LATENCY_BUCKETS = (0.001, 0.01, 0.1, 1.0, 10.0)
 
 
-type IdentityFunction[T] = Callable[[T], T]
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    coalesced: int = 0
+    refreshes: int = 0
+    refresh_failures: int = 0
+    shared_hits: int = 0
+    miss_latency: list[int] = field(
+        default_factory=lambda: [0] * (len(LATENCY_BUCKETS) + 1)
+    )
+
+    def record_miss(self, seconds: float) -> None:
+        self.misses += 1
+        self.miss_latency[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+    def reset(self) -> None:
+        vars(self).update(vars(CacheStats()))
+
+
+@dataclass
+class Instrumented:
+    name: str
+    cache: MutableMapping[Any, Any]
+    stats: CacheStats
+
+    def info(self) -> dict[str, Any]:
+        maxsize = getattr(self.cache, 'maxsize', None)
+        return {
+            **asdict(self.stats),
+            'miss_latency': {
+                f'<={bound}': count
+                for bound, count in zip(LATENCY_BUCKETS, self.stats.miss_latency)
+            }
+            | {f'>{LATENCY_BUCKETS[-1]}': self.stats.miss_latency[-1]},
+            'size': len(self.cache),
+            'maxsize': maxsize if maxsize != math.inf else None,
+            'bytes': sum(map(approximate_size, list(self.cache.values()))),
+        }
+
+
+_caches: list[Instrumented] = []
+
+
+def approximate_size(value: object) -> int:
+    try:
+        return len(pickle.dumps(value))
+    except Exception:
+        return sys.getsizeof(value)
+
+
+def _register(func: Callable[..., Any], cache: MutableMapping[Any, Any]) -> CacheStats:
+    stats = CacheStats()
+
+    if isinstance(cache, Cache):
+        # cachetools evicts entries to make room through popitem
+        popitem = cache.popitem
+
+        def evict() -> tuple[Any, Any]:
+            stats.evictions += 1
+            return popitem()
+
+        setattr(cache, 'popitem', evict)
+
+    _caches.append(Instrumented(f'{func.__module__}.{func.__qualname__}', cache, stats))
+    return stats
+
 
-_caches: list[Cache] = []
+def _memoize[T, **P](
+    cache: MutableMapping[Any, Any], func: Callable[P, T]
+) -> Callable[P, T]:
+    stats = _register(func, cache)
+    lock = RLock()
 
+    @wraps(func)
+    def wrapped(*args: P.args, **kwargs: P.kwargs) -> T:
+        key = hashkey(*args, **kwargs)  # type: ignore[arg-type]
+        with lock:
+            try:
+                value = cache[key]
+            except KeyError:
+                pass
+            else:
+                stats.hits += 1
+                return value
 
-def _append(t: object) -> None:
-    assert isinstance(t, Cache)
-    _caches.append(t)
+        start = time.perf_counter()
+        value = func(*args, **kwargs)
+        stats.record_miss(time.perf_counter() - start)
+
+        with lock:
+            try:
+                cache[key] = value
+            except ValueError:
+                pass  # value too large
+        return value
+
+    setattr(wrapped, 'cache', cache)
+    setattr(wrapped, 'cache_stats', stats)
+    return wrapped
 
 
 def lru_cache(maxsize: int | None = None) -> IdentityFunction:
     def wrapper[T, **P](func: Callable[P, T]) -> Callable[P, T]:
-        cache = _lru_cache(maxsize)(func)
-        _append(cache)
-        return cache
+        return _memoize(LRUCache(maxsize or math.inf), func)
 
     return wrapper
 
 
-def ttl_cache(maxsize: int | None = None) -> IdentityFunction:
+def ttl_cache(maxsize: int | None = None, ttl: float = 600) -> IdentityFunction:
     def wrapper[T, **P](func: Callable[P, T]) -> Callable[P, T]:
-        cache = _ttl_cache(maxsize)(func)
-        _append(cache)
-        return cache
+        return _memoize(TTLCache(maxsize or math.inf, ttl), func)
 
     return wrapper
 
 
-def cached(cache: MutableMapping[Any, Any]) -> IdentityFunction:
-    def wrapper[T, **P](func: Callable[P, T]) -> Callable[P, T]:
-        c = _cached(cache)(func)
-        _append(cache)
-        return cast(Callable[P, T], c)
+_adapters: dict[Any, TypeAdapter[Any]] = {}
+
+
+def type_adapter[T](type_: type[T]) -> TypeAdapter[T]:
+    """
+    Returns a TypeAdapter for `type_`, building it the first time it's asked
+    for, as building one is far more expensive than validating with it.
+    """
+    try:
+        return _adapters[type_]
+    except KeyError:
+        adapter = _adapters[type_] = TypeAdapter(type_)
+        return adapter
+
+
+class Stale[T](NamedTuple):
+    value: T
+    fresh_until: float
+
+
+_shared: BaseCache | None = None
+
+
+def set_shared_cache(cache: BaseCache | None) -> None:
+    global _shared
+    _shared = cache
+
+
+def get_shared_cache() -> BaseCache | None:
+    return _shared
+
+
+def cached(
+    cache: MutableMapping[Any, Any],
+    *,
+    stale_after: float | None = None,
+    shared_ttl: int | None = None,
+) -> IdentityFunction:
+    """
+    Caches the results of a coroutine function.
+
+    Concurrent misses for the same key share a single in-flight call, failures
+    are propagated to every waiter and are not cached.
+
+    With `stale_after`, entries older than that many seconds are still served,
+    but are refreshed in the background. How long stale entries may be served
+    for is then up to the cache itself (eg, the ttl of a `TTLCache`), and a
+    failed refresh leaves the stale entry in place.
+
+    With `shared_ttl`, misses are first looked up in the shared cache (see
+    `set_shared_cache`) before calling the function, and results are written
+    back to it, so they can be reused by other workers.
+    """
+
+    def wrapper[T, **P](
+        func: Callable[P, Coroutine[Any, Any, T]],
+    ) -> Callable[P, Coroutine[Any, Any, T]]:
+        inflight: dict[Hashable, asyncio.Future[T]] = {}
+        stats = _register(func, cache)
+        name = f'{func.__module__}.{func.__qualname__}'
+
+        @cache_function
+        def adapter() -> TypeAdapter[T]:
+            return type_adapter(get_type_hints(func)['return'])
+
+        async def load(key: Hashable, *args: P.args, **kwargs: P.kwargs) -> T:
+            shared = _shared
+            if shared is None or shared_ttl is None:
+                return await func(*args, **kwargs)
+
+            shared_key = f'{name}{key!r}'
+            try:
+                raw = await shared.get(shared_key)
+            except Exception:
+                logger.warning('Unable to read %s from shared cache', shared_key)
+                raw = None
+            if raw is not None:
+                stats.shared_hits += 1
+                return adapter().validate_json(raw)
+
+            value = await func(*args, **kwargs)
+            try:
+                await shared.set(shared_key, adapter().dump_json(value), ttl=shared_ttl)
+            except Exception:
+                logger.warning('Unable to write %s to shared cache', shared_key)
+            return value
+
+        def done(key: Hashable, future: asyncio.Future[T]) -> None:
+            inflight.pop(key, None)
+            if future.cancelled():
+                return
+            if exc := future.exception():
+                if key in cache:
+                    stats.refresh_failures += 1
+                    logger.warning(
+                        'Failed to refresh %s, serving stale value',
+                        func.__qualname__,
+                        exc_info=exc,
+                    )
+                return
+            store(key, future.result())
+
+        def store(key: Hashable, value: T) -> None:
+            try:
+                cache[key] = (
+                    value
+                    if stale_after is None
+                    else Stale(value, time.monotonic() + stale_after)
+                )
+            except ValueError:
+                pass  # value too large
+
+        def call(key: Hashable, *args: P.args, **kwargs: P.kwargs) -> asyncio.Future[T]:
+            future = inflight.get(key)
+            if future is None:
+                future = inflight[key] = asyncio.ensure_future(
+                    load(key, *args, **kwargs)
+                )
+                future.add_done_callback(partial(done, key))
+            else:
+                stats.coalesced += 1
+            return future
+
+        @wraps(func)
+        async def wrapped(*args: P.args, **kwargs: P.kwargs) -> T:
+            key = hashkey(*args, **kwargs)  # type: ignore[arg-type]
+            try:
+                value = cache[key]
+            except KeyError:
+                pass
+            else:
+                stats.hits += 1
+                if stale_after is None:
+                    return value
+                if value.fresh_until < time.monotonic() and key not in inflight:
+                    stats.refreshes += 1
+                    call(key, *args, **kwargs)
+                return value.value
+
+            start = time.perf_counter()
+            try:
+                # shielded so a cancelled waiter doesn't cancel the shared call
+                return await asyncio.shield(call(key, *args, **kwargs))
+            finally:
+                stats.record_miss(time.perf_counter() - start)
+
+        def cache_prime(value: T, *args: P.args, **kwargs: P.kwargs) -> None:
+            store(hashkey(*args, **kwargs), value)  # type: ignore[arg-type]
+
+        def cache_refresh(*args: P.args, **kwargs: P.kwargs) -> asyncio.Future[T]:
+            key = hashkey(*args, **kwargs)  # type: ignore[arg-type]
+            return asyncio.shield(call(key, *args, **kwargs))
+
+        setattr(wrapped, 'cache', cache)
+        setattr(wrapped, 'cache_prime', cache_prime)
+        setattr(wrapped, 'cache_refresh', cache_refresh)
+        setattr(wrapped, 'cache_stats', stats)
+        return wrapped
 
     return wrapper
 
 
+def prime[T, **P](
+    func: Callable[P, Coroutine[Any, Any, T]],
+    value: T,
+    *args: P.args,
+    **kwargs: P.kwargs,
+) -> None:
+    """
+    Stores `value` in the cache of a function wrapped with `cached`, as if it
+    had been returned for the given arguments.
+    """
+    getattr(func, 'cache_prime')(value, *args, **kwargs)
+
+
+def is_cached[T, **P](
+    func: Callable[P, Coroutine[Any, Any, T]],
+    *args: P.args,
+    **kwargs: P.kwargs,
+) -> bool:
+    """
+    Whether a function wrapped with `cached` has a value, fresh or stale,
+    cached for the given arguments.
+    """
+    return hashkey(*args, **kwargs) in getattr(func, 'cache')  # type: ignore[arg-type]
+
+
+async def refresh[T, **P](
+    func: Callable[P, Coroutine[Any, Any, T]],
+    *args: P.args,
+    **kwargs: P.kwargs,
+) -> T:
+    """
+    Calls a function wrapped with `cached` regardless of what is already
+    cached for the given arguments, and stores the result.
+    """
+    return await getattr(func, 'cache_refresh')(*args, **kwargs)
+
+
 def cache_clear() -> None:
-    for c in _caches:
-        c.clear()
+    for entry in _caches:
+        entry.cache.clear()
+        entry.stats.reset()
+
+
+def cache_info() -> dict[str, dict[str, Any]]:
+    return {entry.name: entry.info() for entry in _caches}
 
 
 class NullPointerException(Exception):
@@ -99,5 +404,50 @@ def create_monitored_task[T](
     return future
 
 
+async def disconnected(request: Request, interval: float = 0.5) -> None:
+    """
+    Returns once the client that made `request` has gone away, checked every
+    `interval` seconds rather than by waiting on receive, which the response
+    is already doing.
+    """
+    while not await request.is_disconnected():
+        await asyncio.sleep(interval)
+
+
+async def cancel_on[T](
+    stop: Awaitable[object], results: AsyncGenerator[T]
+) -> AsyncGenerator[T]:
+    """
+    Yields from `results` until `stop` finishes, at which point whatever
+    `results` is waiting on is cancelled, rather than left to run until it
+    next yields. With `stop` waiting on a client, searches stop as soon as
+    the client goes away, rather than when we next try to send them
+    something.
+    """
+    stopped = asyncio.ensure_future(stop)
+    try:
+        async with aclosing(results):
+            while True:
+                step = asyncio.ensure_future(anext(results))
+                try:
+                    await asyncio.wait(
+                        [step, stopped], return_when=asyncio.FIRST_COMPLETED
+                    )
+                finally:
+                    if not step.done():
+                        step.cancel()
+                        with suppress(asyncio.CancelledError):
+                            await step
+                if step.cancelled():
+                    return
+                try:
+                    item = step.result()
+                except StopAsyncIteration:
+                    return
+                yield item
+    finally:
+        stopped.cancel()
+
+
 def format_marker(season: int, episode: int | None) -> str:
     return f'S{season:02d}E{episode:02d}' if episode else f'S{season:02d}'
@@ -0,0 +1,166 @@
+import asyncio
+import logging
+from collections.abc import AsyncGenerator, Coroutine
+from contextlib import asynccontextmanager, suppress
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+from typing import Any
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.future import select
+
+from .config import cache_warm_interval
+from .db import Download, EpisodeDetails, Monitor, MonitorMediaType
+from .models import MediaType, SearchResponse
+from .ratelimit import background
+from .search_index import title_index
+from .tmdb import APPEND_TO_RESPONSE_LIMIT, get_movie, get_tv_episodes, prefetch_tv
+from .types import TmdbId
+from .utils import refresh
+
+logger = logging.getLogger(__name__)
+
+CONCURRENCY = 4
+
+
+@dataclass
+class Library:
+    # the season packs in the library for each show
+    shows: dict[TmdbId, set[int]] = field(default_factory=dict)
+    movies: set[TmdbId] = field(default_factory=set)
+    titles: list[SearchResponse] = field(default_factory=list)
+
+    def add_title(self, type: MediaType, tmdb_id: TmdbId, title: str) -> None:
+        self.titles.append(
+            SearchResponse(type=type, tmdb_id=tmdb_id, title=title, year=None)
+        )
+
+
+@dataclass
+class WarmerProgress:
+    runs: int = 0
+    total: int = 0
+    done: int = 0
+    failed: int = 0
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+
+
+progress = WarmerProgress()
+
+
+async def get_library(sessionmaker: async_sessionmaker) -> Library:
+    library = Library()
+
+    async with sessionmaker() as session:
+        shows = await session.execute(
+            select(Download.tmdb_id, EpisodeDetails.show_title)
+            .join(Download.episode)
+            .distinct()
+        )
+        for tmdb_id, title in shows:
+            if tmdb_id:
+                library.shows.setdefault(tmdb_id, set())
+                library.add_title(MediaType.SERIES, tmdb_id, title)
+
+        # season packs are resolved into their episodes when listing the
+        # library, so those are the seasons worth keeping warm
+        packs = await session.execute(
+            select(Download.tmdb_id, EpisodeDetails.season)
+            .join(Download.episode)
+            .where(EpisodeDetails.episode.is_(None))
+            .distinct()
+        )
+        for tmdb_id, season in packs:
+            if tmdb_id:
+                library.shows.setdefault(tmdb_id, set()).add(season)
+
+        movies = await session.execute(
+            select(Download.tmdb_id, Download.title).join(Download.movie).distinct()
+        )
+        for tmdb_id, title in movies:
+            if tmdb_id:
+                library.movies.add(tmdb_id)
+                library.add_title(MediaType.MOVIE, tmdb_id, title)
+
+        monitors = await session.execute(
+            select(Monitor.tmdb_id, Monitor.type, Monitor.title).distinct()
+        )
+        for tmdb_id, type, title in monitors:
+            if type == MonitorMediaType.TV:
+                library.shows.setdefault(tmdb_id, set())
+                library.add_title(MediaType.SERIES, tmdb_id, title)
+            else:
+                library.movies.add(tmdb_id)
+                library.add_title(MediaType.MOVIE, tmdb_id, title)
+
+    return library
+
+
+async def warm_show(tmdb_id: TmdbId, seasons: set[int]) -> None:
+    ordered = tuple(sorted(seasons))
+    await refresh(prefetch_tv, tmdb_id, ordered)
+    # seasons that didn't fit alongside the show and its external ids
+    for season in ordered[APPEND_TO_RESPONSE_LIMIT - 1 :]:
+        await refresh(get_tv_episodes, tmdb_id, season)
+
+
+async def warm_movie(tmdb_id: TmdbId) -> None:
+    await get_movie(tmdb_id)
+
+
+async def warm(sessionmaker: async_sessionmaker) -> None:
+    library = await get_library(sessionmaker)
+    title_index.update(library.titles)
+    jobs: list[Coroutine[Any, Any, None]] = [
+        *(warm_show(tmdb_id, seasons) for tmdb_id, seasons in library.shows.items()),
+        *(warm_movie(tmdb_id) for tmdb_id in library.movies),
+    ]
+
+    progress.runs += 1
+    progress.total = len(jobs)
+    progress.done = progress.failed = 0
+    progress.started_at = datetime.now(UTC)
+    progress.finished_at = None
+
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def run(job: Coroutine[Any, Any, None]) -> None:
+        async with semaphore:
+            try:
+                await job
+            except Exception:
+                progress.failed += 1
+                logger.warning('Failed to warm cache', exc_info=True)
+            else:
+                progress.done += 1
+
+    with background():
+        await asyncio.gather(*map(run, jobs))
+
+    progress.finished_at = datetime.now(UTC)
+    logger.info('Warmed %d of %d library entries', progress.done, progress.total)
+
+
+async def run_warmer(sessionmaker: async_sessionmaker, interval: float) -> None:
+    while True:
+        try:
+            await warm(sessionmaker)
+        except Exception:
+            logger.exception('Failed to warm cache')
+        await asyncio.sleep(interval)
+
+
+@asynccontextmanager
+async def cache_warmer(sessionmaker: async_sessionmaker) -> AsyncGenerator[None]:
+    """
+    Keeps the TMDB metadata for everything in the library, and everything
+    being monitored, cached for as long as the app is running.
+    """
+    task = asyncio.create_task(run_warmer(sessionmaker, cache_warm_interval))
+    try:
+        yield
+    finally:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
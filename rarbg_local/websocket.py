@@ -3,11 +3,13 @@ import time
 from asyncio import create_task, sleep
 from collections import ChainMap
 from collections.abc import AsyncGenerator, Coroutine
+from contextlib import aclosing
 from enum import IntEnum
 from typing import Annotated, Literal, Union
 
 from fastapi import APIRouter, HTTPException, Request, WebSocket
 from pydantic import BaseModel, Field, RootModel, SecretStr, ValidationError
+from starlette.websockets import WebSocketState
 
 from .auth import security
 from .db import (
@@ -16,14 +18,16 @@ from .db import (
 from .models import ITorrent, PlexMedia, PlexResponse
 from .plex import get_imdb_in_plex, gracefully_get_plex
 from .providers import (
+    Deduplicator,
     search_for_movie,
     search_for_tv,
 )
+from .ranking import RankBy, top_k
 from .settings import get_settings
 from .singleton import get
 from .tmdb import ThingType, get_movie_imdb_id, get_tv_imdb_id
 from .types import TmdbId
-from .utils import Message, non_null
+from .utils import Message, cancel_on, non_null
 
 logger = logging.getLogger(__name__)
 
@@ -46,6 +50,13 @@ class StreamArgs(BaseModel):
     tmdb_id: TmdbId
     season: int | None = None
     episode: int | None = None
+    # skip cached provider results
+    fresh: bool = False
+    # seconds to wait for providers before finishing with what we have
+    deadline: float | None = Field(default=None, gt=0)
+    # only send changes to the best `top` results, rather than every result
+    top: int | None = Field(default=None, gt=0)
+    rank_by: RankBy = 'seeders'
 
 
 class StreamRequest(BaseRequest[Literal['stream'], StreamArgs]):
@@ -81,20 +92,40 @@ async def _stream(
     tmdb_id: TmdbId,
     season: int | None = None,
     episode: int | None = None,
+    fresh: bool = False,
+    deadline: float | None = None,
+    limit: int | None = None,
 ) -> AsyncGenerator[ITorrent]:
+    '''
+    Results from every provider, deduplicated. With a `limit`, each provider
+    stops searching once it's found that many
+    '''
     if type == 'series':
-        tasks, queue = await search_for_tv(
-            await get_tv_imdb_id(tmdb_id), tmdb_id, non_null(season), episode
+        results = search_for_tv(
+            await get_tv_imdb_id(tmdb_id),
+            tmdb_id,
+            non_null(season),
+            episode,
+            fresh=fresh,
+            deadline=deadline,
+            limit=limit,
         )
     else:
-        tasks, queue = await search_for_movie(await get_movie_imdb_id(tmdb_id), tmdb_id)
+        results = search_for_movie(
+            await get_movie_imdb_id(tmdb_id),
+            tmdb_id,
+            fresh=fresh,
+            deadline=deadline,
+            limit=limit,
+        )
 
-    while not all(task.done() for task in tasks):
-        item = await queue.get()
-        if isinstance(item, Message):
-            logger.info('Message from provider: %s', item)
-        else:
-            yield item
+    dedupe = Deduplicator()
+    async with aclosing(results):
+        async for item in results:
+            if isinstance(item, Message):
+                logger.info('Message from provider: %s', item)
+            elif kept := dedupe.add(item):
+                yield kept
 
 
 def make_request(websocket: WebSocket, request: BaseRequest) -> Request:
@@ -190,6 +221,16 @@ class PlexRootResponse(SuccessResult[dict[str, PlexResponse[PlexMedia]]]):
     pass
 
 
+async def receive_until_disconnect(websocket: WebSocket) -> None:
+    '''
+    Reads from `websocket` while a stream is being sent, returning once the
+    client disconnects. There's one request per connection, so anything else
+    the client sends is logged and dropped
+    '''
+    while (message := await websocket.receive())['type'] != 'websocket.disconnect':
+        logger.warning('Ignoring message received mid stream: %s', message)
+
+
 @websocket_ns.websocket("/ws")
 async def websocket_stream(websocket: WebSocket) -> None:
     logger.info('Got websocket connection')
@@ -209,14 +250,23 @@ async def websocket_stream(websocket: WebSocket) -> None:
 
     if isinstance(request, StreamRequest):
         args = request.params
-        async for item in _stream(
+        results = _stream(
             type=args.type,
             tmdb_id=args.tmdb_id,
             season=args.season,
             episode=args.episode,
-        ):
+            fresh=args.fresh,
+            deadline=args.deadline,
+        )
+        updates: AsyncGenerator[BaseModel] = (
+            top_k(results, args.top, args.rank_by) if args.top else results
+        )
+        async for item in cancel_on(receive_until_disconnect(websocket), updates):
             await websocket.send_json(item.model_dump(mode='json'))
 
+        if websocket.client_state is WebSocketState.DISCONNECTED:
+            logger.info('Client went away mid stream')
+            return
         message = 'Finished streaming'
     elif isinstance(request, PingRequest):
         message = 'Pong'
@@ -0,0 +1,137 @@
+'''
+Compares decoding TMDB and piratebay responses via a dict (as we used to)
+against validating the raw bytes with a prebuilt validator
+
+    uv run --group cli python scripts/bench_json.py
+'''
+
+import json
+import sys
+from collections.abc import Callable
+from pathlib import Path
+from timeit import repeat
+
+from pydantic import TypeAdapter
+from rich.console import Console
+from rich.table import Table
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from rarbg_local.models import TvSeasonResponse  # noqa: E402
+from rarbg_local.providers.piratebay import PirateTorrent  # noqa: E402
+from rarbg_local.tmdb import SearchBaseResponse  # noqa: E402
+from rarbg_local.utils import type_adapter  # noqa: E402
+
+NUMBER = 200
+
+console = Console()
+
+search = (
+    Path(__file__).resolve().parent.parent
+    / 'rarbg_local/tests/testresources/test_tmdb/test_load/tmdb.json'
+).read_bytes()
+
+# shaped like a season from tv/{id}/season/{season}, crew and guest stars
+# included, as those make up most of the payload
+season = json.dumps(
+    {
+        '_id': '5256c8c219c2956ff604ed46',
+        'air_date': '2011-04-17',
+        'name': 'Season 1',
+        'season_number': 1,
+        'episodes': [
+            {
+                'id': 63056 + i,
+                'name': f'Episode {i}',
+                'episode_number': i,
+                'air_date': '2011-04-17',
+                'overview': 'Lorem ipsum dolor sit amet. ' * 10,
+                'still_path': '/9hGF3WUkBf7cSjMg0cdMDHJkByd.jpg',
+                'vote_average': 7.8,
+                'vote_count': 250,
+                'crew': [
+                    {
+                        'id': j,
+                        'job': 'Director',
+                        'department': 'Directing',
+                        'name': f'Crew {j}',
+                        'profile_path': None,
+                    }
+                    for j in range(15)
+                ],
+                'guest_stars': [
+                    {
+                        'id': j,
+                        'character': f'Character {j}',
+                        'name': f'Guest {j}',
+                        'order': j,
+                        'profile_path': '/xkCGuQULcQCH2GZ3NgnBEiLxTSM.jpg',
+                    }
+                    for j in range(20)
+                ],
+            }
+            for i in range(1, 11)
+        ],
+    }
+).encode()
+
+piratebay = json.dumps(
+    [
+        {
+            'id': str(i),
+            'name': f'Some.Show.S01E{i:02d}.1080p.WEB.H264-GROUP',
+            'info_hash': f'{i:040X}',
+            'leechers': '3',
+            'seeders': str(100 - i),
+            'num_files': '1',
+            'size': '1234567890',
+            'username': 'uploader',
+            'added': '1600000000',
+            'status': 'vip',
+            'category': '208',
+            'imdb': 'tt0944947',
+        }
+        for i in range(100)
+    ]
+).encode()
+
+
+def bench(before: Callable[[], object], after: Callable[[], object]) -> list[str]:
+    assert before() == after()
+    old, new = (
+        min(repeat(fn, number=NUMBER, repeat=5)) / NUMBER * 1e6
+        for fn in (before, after)
+    )
+    return [f'{old:.1f}us', f'{new:.1f}us', f'{old / new:.1f}x']
+
+
+def main() -> None:
+    table = Table('payload', 'via dict', 'from bytes', 'speedup')
+    table.add_row(
+        'tmdb search',
+        *bench(
+            lambda: SearchBaseResponse.model_validate(json.loads(search)),
+            lambda: SearchBaseResponse.model_validate_json(search),
+        ),
+    )
+    table.add_row(
+        'tmdb season',
+        *bench(
+            lambda: TvSeasonResponse.model_validate(json.loads(season)),
+            lambda: TvSeasonResponse.model_validate_json(season),
+        ),
+    )
+    table.add_row(
+        'piratebay',
+        *bench(
+            lambda: TypeAdapter(list[PirateTorrent]).validate_python(
+                json.loads(piratebay)
+            ),
+            lambda: type_adapter(list[PirateTorrent]).validate_json(piratebay),
+        ),
+    )
+    console.print(table)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+'''
+Compares how long the event loop is held up while parsing the recorded
+provider pages on the loop (as we used to) against handing them to the
+parsing executor, in threads and in processes
+
+    uv run --group cli python scripts/bench_parsing.py
+'''
+
+import asyncio
+import sys
+import time
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+from typing import Any
+
+from pydantic import SecretStr
+from rich.console import Console
+from rich.table import Table
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from rarbg_local.parsing import parse_executor, run_parser  # noqa: E402
+from rarbg_local.providers.horriblesubs import (  # noqa: E402
+    parse_downloads,
+    parse_shows,
+)
+from rarbg_local.providers.kickass import parse_page  # noqa: E402
+from rarbg_local.settings import Settings  # noqa: E402
+
+NUMBER = 20
+# how often the probe asks to be woken, in seconds
+TICK = 0.001
+
+console = Console()
+
+resources = (
+    Path(__file__).resolve().parent.parent
+    / 'rarbg_local/tests/testresources/providers/test_horriblesubs'
+)
+shows = (resources / 'test_provider/shows.html').read_text()
+downloads = (resources / 'test_get_downloads/results.html').read_text()
+
+
+def kickass_row(i: int) -> str:
+    return f'''
+<tr>
+    <td><a class="torrents_table__torrent_title" href="">Show S01E{i:02d}</a></td>
+    <td><a href="magnet:?xt=urn:btih:{i:040x}">Magnet</a></td>
+    <td data-title="Seed">1,{i:03d}</td>
+</tr>'''
+
+
+# shaped like the pages in tests/providers/test_kickass.py, but with a full
+# page of results for each resolution
+kickass = ''.join(
+    f'''
+<div class="tab_content" id="{resolution}">
+    <table><tbody>{''.join(map(kickass_row, range(50)))}</tbody></table>
+</div>'''
+    for resolution in ('1080', '720', '480')
+).encode()
+
+pages: list[tuple[str, Callable[[Any], object], str | bytes]] = [
+    ('horriblesubs shows', parse_shows, shows),
+    ('horriblesubs downloads', parse_downloads, downloads),
+    ('kickass', parse_page, kickass),
+]
+
+
+async def lag(parse: Callable[[], Awaitable[object]]) -> tuple[float, float]:
+    '''
+    Returns the time taken per parse, and the longest a task that wanted to
+    run every TICK was kept waiting
+    '''
+    worst = 0.0
+    done = False
+
+    async def probe() -> None:
+        nonlocal worst
+        while not done:
+            start = time.perf_counter()
+            await asyncio.sleep(TICK)
+            worst = max(worst, time.perf_counter() - start - TICK)
+
+    task = asyncio.create_task(probe())
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    for _ in range(NUMBER):
+        await parse()
+        # as a request would between pages, so we see the worst single parse
+        await asyncio.sleep(0)
+    elapsed = time.perf_counter() - start
+    done = True
+    await task
+    return elapsed / NUMBER, worst
+
+
+async def on_loop(func: Callable[[Any], object], arg: object) -> object:
+    return func(arg)
+
+
+async def main() -> None:
+    table = Table(
+        'page',
+        'on the loop',
+        'threads',
+        'processes',
+        caption='time per parse / longest the loop was held up',
+    )
+    cells: dict[str, list[str]] = {name: [] for name, _, _ in pages}
+
+    # None parses on the loop
+    for processes in (None, 0, 2):
+        settings = Settings(
+            plex_token=SecretStr('plex_token'),
+            statsig_key=SecretStr('statsig_key'),
+            parse_processes=processes or 0,
+        )
+        async with parse_executor(settings):
+            for name, func, arg in pages:
+                if processes is None:
+                    elapsed, worst = await lag(lambda: on_loop(func, arg))
+                else:
+                    # warm up the pool, so starting processes isn't counted
+                    await run_parser(func, arg)
+                    elapsed, worst = await lag(lambda: run_parser(func, arg))
+                cells[name].append(f'{elapsed * 1e3:.1f}ms / {worst * 1e3:.1f}ms')
+
+    for name, row in cells.items():
+        table.add_row(name, *row)
+    console.print(table)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())